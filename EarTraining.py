@@ -1,13 +1,91 @@
 import random
 import threading
 import time
-import mido
-from soundmodule import midi_to_frequency, create_note, generate_chord
+from soundmodule import (midi_to_frequency, synthesize_note, synthesize_progression, sequential_segments, render_timeline,
+                         stream_timeline, timeline_peak, quantize, quantize_stream, STREAM_CHUNK_SAMPLES, QUALITY_TIERS)
+from sequencegenerator import generate_test_sequences, weakness_weights, weighted_note_tables
+from audiocache import AudioCache
+from chordbank import get_chord_bank, CADENCE_CHORD_DURATION, CADENCE_FADE_DURATION
+from notebank import get_note_bank
+from statsstore import StatsStore
+from settingsstore import settings
+from tracing import tracer
+from audioplayer import get_audio_player
+from midiplayer import round_events, midi_player_from_environment
 import numpy as np
 import os
 import shutil
-from scipy.io import wavfile
-import pygame
+from array import array
+from collections import deque
+from functools import lru_cache
+
+# Builds upcoming rounds on a worker thread so "Next" does not wait for synthesis
+class RoundPrefetcher:
+
+    def __init__(self, build_round, depth=2):
+        self.build_round = build_round  # Callable returning a ready-to-play round
+        self.depth = depth  # Maximum number of ready rounds kept in the queue
+        self.ready = deque()
+        self.generation = 0  # Bumped whenever queued rounds become stale
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the worker thread if it is not already running."""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the worker thread and drop any queued rounds."""
+        with self.condition:
+            self.running = False
+            self.ready.clear()
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def invalidate(self):
+        """Discard queued rounds, e.g. after the mode, key or difficulty changed."""
+        with self.condition:
+            self.generation += 1
+            self.ready.clear()
+            self.condition.notify_all()
+
+    def get(self):
+        """Return the next ready round, or None if nothing is queued."""
+        with self.condition:
+            if not self.ready:
+                return None
+            round_data = self.ready.popleft()
+            self.condition.notify_all()  # Wake the worker to refill the queue
+            return round_data
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while self.running and len(self.ready) >= self.depth:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation = self.generation
+            try:
+                round_data = self.build_round()
+            except Exception as e:
+                print(f"An error occurred while prefetching: {e}")
+                with self.condition:
+                    self.running = False
+                return
+            with self.condition:
+                # Rounds built against settings that changed meanwhile are thrown away
+                if generation == self.generation and len(self.ready) < self.depth:
+                    self.ready.append(round_data)
+
 
 # Class that manages the ear training game
 class EarTrainingGame:
@@ -26,39 +104,6 @@ class EarTrainingGame:
         'Ab': -4, 'A': -3, 'A#': -2, 'Bb': -2, 'B': -1
     }
 
-    # Difficulty settings for various levels
-    settings_easy = {
-        "number_of_notes": 2.0,
-        "octave_range": 1.0,
-        "duration": 2.0
-    }
-
-    settings_medium = {
-        "number_of_notes": 3.0,
-        "octave_range": 1.0,
-        "duration": 1.5
-    }
-
-    settings_hard = {
-        "number_of_notes": 5.0,
-        "octave_range": 2.0,
-        "duration": 1.0
-    }
-
-    settings_impossible = {
-        "number_of_notes": 16.0,
-        "octave_range": 3.0,
-        "duration": 0.5
-    }
-
-    settings_custom = {
-        "number_of_notes": 7.0,
-        "octave_range": 1.0,
-        "duration": 0.5
-    }
-
-
-
     # MIDI note sequences for various musical modes based on the C major scale
     modes = {
         "Ionian": [60, 62, 64, 65, 67, 69, 71],  # C D E F G A B
@@ -83,67 +128,164 @@ class EarTrainingGame:
         "Custom": []
     }
     
-    gamepoints = 0.0
-    required_gamepoints = 4.0
     level_up_scalar = 1.1
     parameter_scalar = 1.3
-    current_level = 0
-    user_guesses = []
-    difficulty = settings_custom
-    mode = modes["Minor Penta"]
-    key = key_to_adjustment["C"]
-    midi_test_notes = ""
-    pre_octave_key_list = ""
-    midi_test_notes_list = []
-    detailed_match = []
+    output_gain = 0.1  # Final amplitude reduction applied to every rendered round
+
+    # Every piece of session state lives on the instance, so games never share it
+    __slots__ = (
+        "user_guesses", "answer_times", "started_at", "stopped_at", "round_started_at", "round_time",
+        "running", "lock", "prefetcher", "on_tick", "tick_timer",
+        "gamepoints", "required_gamepoints", "current_level", "difficulty", "mode", "key",
+        "midi_test_notes", "pre_octave_key_list", "midi_test_notes_list", "detailed_match", "audio_buffer",
+        "audio_file", "audio_cache", "trace", "round_prefetched", "player", "midi_player", "dither", "sample_rate", "chord_bank", "note_bank", "stats",
+        "mode_name", "difficulty_name", "confusion", "note_tables", "adaptive",
+        "in_memory_playback", "export_audio", "autoplay", "prefetch_depth", "notification_interval", "record_stats",
+        "__weakref__"
+    )
             
-    def __init__(self):
-        self.user_guesses = []  # List to store user guesses
-        self.elapsed_time = 0.0  # Track elapsed time since the game started
+    def __init__(self, in_memory_playback=True, export_audio=False, autoplay=True, prefetch_depth=2,
+                 notification_interval=None, audio_cache=None, player=None, dither=False, record_stats=True,
+                 stats_store=None, adaptive=False, midi_player=None, quality="high", chord_bank=None,
+                 note_bank=None):
+        self.in_memory_playback = in_memory_playback  # Hand rendered audio straight to the mixer
+        self.export_audio = export_audio  # Also write every round to the audio cache
+        self.autoplay = autoplay  # Play each new round as soon as it is loaded
+        self.prefetch_depth = prefetch_depth  # Number of upcoming rounds built ahead of time
+        self.notification_interval = notification_interval  # Seconds between on_tick callbacks, None to disable
+        self.audio_cache = AudioCache() if audio_cache is None else audio_cache  # Exported rounds live here
+        self.player = get_audio_player() if player is None else player  # Shared, persistent mixer
+        self.midi_player = midi_player  # Play rounds as scheduled MIDI events instead of audio when set
+        self.dither = dither  # Add triangular dither when quantizing the final mix
+        self.sample_rate = QUALITY_TIERS[quality]  # Used for synthesis, fades, files and the mixer alike
+        # Pre-rendered intros for every key and mode, shared by all games at this sample rate
+        self.chord_bank = get_chord_bank(self.reference_cadences(), self.sample_rate) if chord_bank is None else chord_bank
+        if note_bank is None:
+            note_bank = get_note_bank(*self.standard_notes(), sample_rate=self.sample_rate)
+        self.note_bank = note_bank  # Pre-rendered notes at every preset duration, shared the same way
+        self.record_stats = record_stats  # Append every graded round to the answer history
+        self.stats = StatsStore() if stats_store is None else stats_store
+        self.adaptive = adaptive  # Favour the degrees the player gets wrong most often
+
+        self.gamepoints = 0.0
+        self.required_gamepoints = 4.0
+        self.current_level = 0
+        self.difficulty = dict(settings.preset("Custom"))  # Private copy, level_up scales it in place
+        self.mode = self.modes["Minor Penta"]
+        self.mode_name = "Minor Penta"
+        self.difficulty_name = "Custom"
+        self.key = self.key_to_adjustment["C"]
+
+        # Note lists and match vectors are compact typed arrays
+        self.user_guesses = array('h')  # MIDI notes guessed so far this round
+        self.answer_times = array('d')  # Seconds from round start to each guess
+        self.midi_test_notes = ""
+        self.pre_octave_key_list = array('h')
+        self.midi_test_notes_list = array('h')
+        self.detailed_match = array('B')
+        self.confusion = np.zeros((12, 12), dtype=np.int64)  # Answers counted by target degree and guessed degree
+        self.note_tables = None  # (mode, start, transitions) cumulative note distributions while adaptive
+        self.audio_buffer = None
+        self.audio_file = None  # Cached WAV of the current round when exporting
+        self.trace = {}  # Span name -> seconds for the current round, filled while tracing
+        self.round_prefetched = False
+
+        self.started_at = None  # time.monotonic() when the game started
+        self.stopped_at = None  # time.monotonic() when the game stopped
+        self.round_started_at = None  # time.monotonic() when the current round began playing
+        self.round_time = None  # Seconds the last graded round took to answer
         self.running = False  # Game state indicator
         self.lock = threading.Lock()  # Lock for thread-safe operations
+        self.prefetcher = RoundPrefetcher(self.build_round, self.prefetch_depth)
+        self.on_tick = None  # Optional callback run every notification_interval seconds
+        self.tick_timer = None
+
+    @property
+    def elapsed_time(self):
+        """Seconds since the game started, computed on demand from the monotonic clock."""
+        if self.started_at is None:
+            return 0.0
+        end = time.monotonic() if self.stopped_at is None else self.stopped_at
+        return end - self.started_at
+
+    def round_elapsed_time(self):
+        """Seconds since the current round started playing."""
+        if self.round_started_at is None:
+            return 0.0
+        return time.monotonic() - self.round_started_at
 
     def start_game(self):
-        """Start the game clock in a separate thread."""
+        """Start the game clock and, if configured, the periodic notification."""
         self.running = True
-        self.thread = threading.Thread(target=self._game_clock)  # Removed daemon=True
-        self.thread.start()
-        self.user_guesses = []
+        self.started_at = time.monotonic()
+        self.stopped_at = None
+        self.schedule_tick()
+        if self.adaptive and self.record_stats:
+            self.confusion = self.stats.confusion_matrix()  # Pick up where earlier sessions left off
+        self.refresh_note_tables()
+        self.user_guesses = array('h')
+        self.answer_times = array('d')
         self.generate_reference_cadence()
         self.midi_test_notes, self.pre_octave_key_list = self.generate_test_sequence()
+        self.prefetcher.start()
+
+    def midi_events(self):
+        """The current round as timestamped MIDI events: cadence, the space_duration gap, then the test notes."""
+        cadence = self.generate_reference_cadence()
+        return round_events(cadence['dominant'], cadence['tonic'], self.midi_test_notes_list,
+                            self.difficulty["duration"], settings.get("space_duration"))
 
     def play_audio(self):
-        print("trying to play")
-        pygame.mixer.init()  # Initialize the mixer module
-        pygame.mixer.stop()  # Stop any currently playing sounds
-        directory = "test_file_folder"
-        audio_file = os.listdir(directory)[0]  # Get the only file in the directory
-        full_path = os.path.join(directory, audio_file)
-        sound = pygame.mixer.Sound(full_path)
-        sound.play()
+        if self.midi_player is not None:
+            with tracer.span("playback_start", self.trace):
+                self.midi_player.play(self.midi_events())
+            return
+        if self.in_memory_playback and self.audio_buffer is not None:
+            sound = self.audio_buffer
+        elif self.audio_file is not None:
+            sound = self.audio_file
+        else:
+            return  # No round loaded yet
+        with tracer.span("mixer_init", self.trace):
+            self.player.init(self.sample_rate)  # Only the first call, or a change of rate, opens the mixer
+            self.player.stop()  # Stop any currently playing sounds
+        with tracer.span("playback_start", self.trace):
+            self.player.play(sound, "test")
 
 
     def stop_game(self):
         """Stop the game clock."""
         self.running = False
-        self.thread.join()  # Wait for the game clock thread to finish
-        self.clear_folder()
-
-    def _game_clock(self):
-        """Private method to update the game clock."""
-        update_counter = 0  # Initialize a counter to track the number of updates
+        self.stopped_at = time.monotonic()
+        if self.tick_timer is not None:
+            self.tick_timer.cancel()
+            self.tick_timer = None
+        self.prefetcher.stop()
+        if self.midi_player is not None:
+            self.midi_player.stop()
+        self.finish_skipped_round()
+
+    def finish_skipped_round(self):
+        """Hand a round that was never validated to the tracer, so skipped rounds still count."""
+        if self.trace:
+            tracer.finish_round(self.trace, number_of_notes=len(self.pre_octave_key_list), key=self.key,
+                                prefetched=self.round_prefetched, skipped=True)
+            self.trace = {}
+
+    def schedule_tick(self):
+        """Schedule the next on_tick callback; idle games schedule nothing."""
+        if not self.running or self.on_tick is None or not self.notification_interval:
+            return
+        self.tick_timer = threading.Timer(self.notification_interval, self._tick)
+        self.tick_timer.daemon = True
+        self.tick_timer.start()
+
+    def _tick(self):
         try:
-            while self.running:
-                with self.lock:
-                    self.elapsed_time += 1/60  # Increment time in seconds
-                time.sleep(1/60)  # Sleep to maintain the 60 Hz update rate
-
-                update_counter += 1  # Increment the update counter
-                if update_counter == 60:  # Check if 1 second has passed
-                    # self.notify_gui()  # Call GUI update method only once per second
-                    update_counter = 0  # Reset counter after updating
+            self.on_tick(self)
         except Exception as e:
             print(f"An error occurred: {e}")
+        self.schedule_tick()
 
     def notify_gui(self):
         """Notify GUI with the current game state."""
@@ -153,6 +295,7 @@ class EarTrainingGame:
         """Add a solfege syllable to the user guesses list."""
         with self.lock:
             self.user_guesses.append(self.solfege_to_midi[solfege])
+            self.answer_times.append(self.round_elapsed_time())
         # self.notify_gui()  # Update GUI after adding a guess
 
     def remove_user_guess(self):
@@ -160,11 +303,10 @@ class EarTrainingGame:
         with self.lock:
             if self.user_guesses:
                 self.user_guesses.pop()
+            if self.answer_times:
+                self.answer_times.pop()
         # self.notify_gui()  # Update GUI after removing a guess
 
-    def notify_gui(self):
-        """Notify GUI with the current game state."""
-        print(f"Elapsed Time: {self.elapsed_time:.2f} seconds, Guesses: {self.user_guesses}")
 
     def process_user_solfege_selections(selected_indices):
     # All possible solfege syllables in a chromatic scale from 'do' to 'ti'
@@ -187,50 +329,100 @@ class EarTrainingGame:
         return result_syllables
 
 
-    def generate_silence(self, duration, sample_rate=44100):
+    def generate_silence(self, duration, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self.sample_rate
         return np.zeros(int(duration * sample_rate), dtype=np.int16)
 
-    def list_to_audiofile(self, midi_test_notes_list, folder_name="test_file_folder", silence_duration=1.0):
-        folder_name = "test_file_folder"
+    def audio_segments(self, midi_test_notes_list, silence_duration=None, duration=None, mode=None, key=None):
+        """Lay out the reference cadence, silence and test notes as timeline segments.
 
-        chord_root_note = self.key + 60
-        chord_waveform = generate_chord(chord_root_note, 2, self.mode, sample_rate=44100)
-        duration = self.difficulty["duration"]
-        concatenated_waveform = np.array([], dtype=np.int16)
+        duration, mode and key default to the current game settings, and
+        silence_duration to the space_duration setting.
+        Returns (segments, total_samples).
+        """
+        if duration is None:
+            duration = self.difficulty["duration"]
+        if mode is None:
+            mode = self.mode
+        if key is None:
+            key = self.key
+        if silence_duration is None:
+            silence_duration = settings.get("space_duration")
+        sample_rate = self.sample_rate
+
+        # Dominant then tonic, one second each with short fades, straight from the bank when it holds them
+        cadence = self.generate_reference_cadence(key, mode)
+        chord_waveform = self.chord_bank.cadence(cadence['dominant'], cadence['tonic'])
+        if chord_waveform is None:
+            chord_waveform = synthesize_progression([cadence['dominant'], cadence['tonic']], CADENCE_CHORD_DURATION,
+                                                    sample_rate, fade_duration=CADENCE_FADE_DURATION)
+
+        # Silence between cadence and notes is the gap left on the timeline
+        notes_start = len(chord_waveform) + int(silence_duration * sample_rate)
+        # Zero-copy views into the note bank, rendering only notes it does not hold
+        notes = []
         for midi_note in midi_test_notes_list:
-            frequency = midi_to_frequency(midi_note)
-            note_waveform = create_note(frequency, duration)
-            concatenated_waveform = np.concatenate((concatenated_waveform, note_waveform))
-        
-        # Append silence between chord and test sequence
-        silence_waveform = self.generate_silence(silence_duration)
-        final_waveform = np.concatenate((chord_waveform, silence_waveform, concatenated_waveform))
-        
-        # Apply fade-in to the beginning of chord waveform
-        fade_in_duration = 0.1  # Adjust fade-in duration as needed
-        fade_in_samples = int(fade_in_duration * 44100)
-        fade_in_curve = np.linspace(0, 1, fade_in_samples, dtype=np.float32)
-        chord_waveform[:fade_in_samples] = (chord_waveform[:fade_in_samples] * fade_in_curve).astype(np.int16)
-
-        # Apply fade-out to the end of chord waveform
-        fade_out_duration = 0.1  # Adjust fade-out duration as needed
-        fade_out_samples = int(fade_out_duration * 44100)
-        fade_out_curve = np.linspace(1, 0, fade_out_samples, dtype=np.float32)
-        chord_waveform[-fade_out_samples:] = (chord_waveform[-fade_out_samples:] * fade_out_curve).astype(np.int16)
-        
-        # Concatenate fade-in/fade-out chord with silence and note waveforms
-        silence_waveform = self.generate_silence(silence_duration)
-        final_waveform = np.concatenate((chord_waveform, silence_waveform, concatenated_waveform))
+            note = self.note_bank.note(midi_note, duration)
+            if note is None:
+                note = synthesize_note(midi_to_frequency(midi_note), duration, sample_rate)
+            notes.append(note)
+        note_segments, total_samples = sequential_segments(notes, notes_start)
+        return [(0, chord_waveform)] + note_segments, total_samples
 
-        # Reduce the amplitude by a factor of 4
-        final_waveform = final_waveform * 0.1
+    def render_audio(self, midi_test_notes_list, silence_duration=None, duration=None, mode=None, key=None):
+        """Render the reference chord, silence and test notes to an int16 buffer.
 
-        if not os.path.exists(folder_name):
-            os.makedirs(folder_name)
+        Everything is mixed in float32 and quantized once at the end.
+        """
+        segments, total_samples = self.audio_segments(midi_test_notes_list, silence_duration, duration, mode, key)
+        final_waveform = render_timeline(segments, total_samples)
 
-        filename = os.path.join(folder_name, "_".join(map(str, midi_test_notes_list)) + "_audiofile.wav")
-        wavfile.write(filename, 44100, final_waveform.astype(np.int16))
-        return filename
+        # Reduce the amplitude by a factor of 10
+        np.multiply(final_waveform, np.float32(self.output_gain), out=final_waveform)
+        return quantize(final_waveform, dither=self.dither)
+
+    def stream_audio(self, midi_test_notes_list, silence_duration=None, chunk_size=STREAM_CHUNK_SAMPLES):
+        """Yield the same audio as render_audio as fixed-size int16 chunks.
+
+        Returns (chunks, total_samples) so callers can size headers up front.
+        """
+        segments, total_samples = self.audio_segments(midi_test_notes_list, silence_duration)
+        chunks = stream_timeline(segments, total_samples, chunk_size, gain=self.output_gain)
+        return quantize_stream(chunks, timeline_peak(segments, self.output_gain), self.dither), total_samples
+
+    def render_parameters(self, midi_test_notes_list, silence_duration=None):
+        """Everything that determines a round's audio, used as its audio cache key."""
+        if silence_duration is None:
+            silence_duration = settings.get("space_duration")
+        return {
+            "notes": [int(note) for note in midi_test_notes_list],
+            "mode": list(self.mode),
+            "key": self.key,
+            "duration": self.difficulty["duration"],
+            "silence_duration": silence_duration,
+            "output_gain": self.output_gain,
+            "dither": self.dither,
+            "sample_rate": self.sample_rate
+        }
+
+    def list_to_audiofile(self, midi_test_notes_list, silence_duration=None, final_waveform=None):
+        """Return a WAV of the round from the audio cache, rendering it only on a miss.
+
+        The file is streamed chunk by chunk unless a rendered buffer is given.
+        """
+        if silence_duration is None:
+            silence_duration = settings.get("space_duration")
+        parameters = self.render_parameters(midi_test_notes_list, silence_duration)
+        filename = self.audio_cache.get(parameters)
+        if filename is not None:
+            return filename
+
+        if final_waveform is None:
+            chunks, _ = self.stream_audio(midi_test_notes_list, silence_duration)
+        else:
+            chunks = [final_waveform]
+        return self.audio_cache.put(parameters, chunks, self.sample_rate)
 
     def string_to_list(self, midi_test_notes):
         midi_test_notes_list = [int(note) for note in midi_test_notes.split('_')]
@@ -251,88 +443,201 @@ class EarTrainingGame:
                 print('Failed to delete %s. Reason: %s' % (file_path, e))
 
 
-    def generate_test_sequence(self):
+    def refresh_note_tables(self):
+        """Recompute the adaptive note distributions for the current mode from the confusion matrix."""
+        mode = self.mode
+        if not self.adaptive or not mode:
+            self.note_tables = None
+            return
+        weights = weakness_weights(self.confusion, np.asarray(mode) - 60)
+        self.note_tables = (mode,) + weighted_note_tables(weights)
+
+    def build_round(self):
+        """Pick the notes for a round and render its audio without touching game state."""
+        mode = self.mode
+        note_tables = self.note_tables
+        difficulty = dict(self.difficulty)
+        key = self.key
+        silence_duration = settings.get("space_duration")
+
+        trace = {}
+        with tracer.span("sequence_generation", trace):
+            number_of_notes = int(difficulty["number_of_notes"])
+            octave_range = int(difficulty["octave_range"])
         
-        self.clear_folder()
-        
-        number_of_notes = int(self.difficulty["number_of_notes"])
-        octave_range = int(self.difficulty["octave_range"])
-        
-        """Generate a sequence of MIDI notes based on given parameters."""
-        midi_sequence = [random.choice(self.mode)]  # Start sequence with a random note
-
-        # Generate remaining notes ensuring no immediate repetitions
-        while len(midi_sequence) < number_of_notes:
-            next_note = random.choice([note for note in self.mode if note != midi_sequence[-1]])
-            midi_sequence.append(next_note)
-
-        pre_octave_key_list = midi_sequence.copy()  # Copy sequence before applying octave adjustments
-        self.pre_octave_key_list = midi_sequence.copy()
-        print(self.pre_octave_key_list)
-        
-        
-        # Apply random octave adjustments
-        octave_adjustments = [random.randint(1, int(octave_range))]  # Ensure initial octave is an integer
-        for _ in range(1, int(number_of_notes)):
-            if octave_adjustments[-1] == 1:
-                try:
-                    octaves = [octave for octave in range(1, int(octave_range+1)) if octave != octave_adjustments[-1]]
-                    next_octave = 1 if random.random() < 0.75 else int(random.choice(octaves))
-                except IndexError:
-                    next_octave = 1  # Default to 1 if list is empty
+            if note_tables is not None and note_tables[0] is mode:
+                # Weighted toward weak degrees, still without immediate repetitions
+                _, start, transitions = note_tables
+                index = min(int(np.searchsorted(start, random.random(), side='right')), len(mode) - 1)
+                midi_sequence = [mode[index]]
+                while len(midi_sequence) < number_of_notes:
+                    index = min(int(np.searchsorted(transitions[index], random.random(), side='right')), len(mode) - 1)
+                    midi_sequence.append(mode[index])
             else:
-                next_octave = int(random.choice([octave for octave in range(1, int(octave_range+1)) if octave != octave_adjustments[-1]]))
-            octave_adjustments.append(next_octave)
-
-        print("Printing Mode:" + str(self.mode))
+                midi_sequence = [random.choice(mode)]  # Start sequence with a random note
 
-        notes_plus_octave = [(note + (octave - 1) * 12) for note, octave in zip(midi_sequence, octave_adjustments)]  # Apply octave adjustments
-        adjusted_notes = [note + self.key for note in notes_plus_octave]  # Apply key adjustment
+                # Generate remaining notes ensuring no immediate repetitions
+                while len(midi_sequence) < number_of_notes:
+                    next_note = random.choice([note for note in mode if note != midi_sequence[-1]])
+                    midi_sequence.append(next_note)
 
-        midi_test_notes = "_".join(map(str, adjusted_notes))  # Convert note list to a string
-        self.midi_test_notes = "_".join(map(str, adjusted_notes))
+            pre_octave_key_list = midi_sequence.copy()  # Copy sequence before applying octave adjustments
         
-        
-        midi_test_notes_list= self.string_to_list(midi_test_notes)
-        print("printing midi_test_notes_list", midi_test_notes_list)
-
-        self.list_to_audiofile(midi_test_notes_list, self.difficulty["duration"])
-
-        self.play_audio()
+            # Apply random octave adjustments
+            octave_adjustments = [random.randint(1, int(octave_range))]  # Ensure initial octave is an integer
+            for _ in range(1, int(number_of_notes)):
+                if octave_adjustments[-1] == 1:
+                    try:
+                        octaves = [octave for octave in range(1, int(octave_range+1)) if octave != octave_adjustments[-1]]
+                        next_octave = 1 if random.random() < 0.75 else int(random.choice(octaves))
+                    except IndexError:
+                        next_octave = 1  # Default to 1 if list is empty
+                else:
+                    next_octave = int(random.choice([octave for octave in range(1, int(octave_range+1)) if octave != octave_adjustments[-1]]))
+                octave_adjustments.append(next_octave)
+
+            notes_plus_octave = [(note + (octave - 1) * 12) for note, octave in zip(midi_sequence, octave_adjustments)]  # Apply octave adjustments
+            adjusted_notes = [note + key for note in notes_plus_octave]  # Apply key adjustment
+
+            midi_test_notes = "_".join(map(str, adjusted_notes))  # Convert note list to a string
+            midi_test_notes_list = self.string_to_list(midi_test_notes)
+
+        audio_buffer = None  # MIDI playback needs no rendered audio
+        if self.midi_player is None:
+            with tracer.span("synthesis", trace):
+                audio_buffer = self.render_audio(midi_test_notes_list, silence_duration, difficulty["duration"], mode, key)
+
+        return {
+            "midi_test_notes": midi_test_notes,
+            "pre_octave_key_list": pre_octave_key_list,
+            "midi_test_notes_list": midi_test_notes_list,
+            "audio_buffer": audio_buffer,
+            "silence_duration": silence_duration,
+            "trace": trace
+        }
+
+    def generate_test_sequence_batch(self, count, seed=None):
+        """Generate count sequences for the current settings as integer arrays.
+
+        Returns (pre_octave_key_lists, adjusted_notes), each of shape
+        (count, number_of_notes). Nothing is rendered or played.
+        """
+        note_tables = self.note_tables
+        if note_tables is not None and note_tables[0] is self.mode:
+            note_tables = note_tables[1:]
+        else:
+            note_tables = None
+        return generate_test_sequences(self.mode, self.difficulty["number_of_notes"],
+                                       self.difficulty["octave_range"], self.key, count, seed, note_tables)
 
-        return midi_test_notes, pre_octave_key_list
+    def generate_test_sequence(self):
+        """Load the next round, prefetched if one is ready, and play it."""
+        self.finish_skipped_round()
+        self.trace = {}
+        with tracer.span("next_to_sound", self.trace):
+            round_data = self.prefetcher.get()
+            if round_data is not None and round_data["silence_duration"] != settings.get("space_duration"):
+                round_data = None  # Built before the space between cadence and notes changed
+            self.round_prefetched = round_data is not None
+            if round_data is None:
+                round_data = self.build_round()
+            self.trace.update(round_data["trace"])
+
+            self.midi_test_notes = round_data["midi_test_notes"]
+            self.pre_octave_key_list = array('h', round_data["pre_octave_key_list"])
+            self.midi_test_notes_list = array('h', round_data["midi_test_notes_list"])
+            self.audio_buffer = round_data["audio_buffer"]
+
+            if self.export_audio or not self.in_memory_playback:
+                with tracer.span("wav_write", self.trace):
+                    self.audio_file = self.list_to_audiofile(self.midi_test_notes_list, round_data["silence_duration"],
+                                                             final_waveform=self.audio_buffer)
+
+            if self.autoplay:
+                self.play_audio()
+        self.round_started_at = time.monotonic()
+
+        return self.midi_test_notes, self.pre_octave_key_list
 
       
     
     
     def restart_game(self):
-        self.user_guesses = []
+        self.user_guesses = array('h')
+        self.answer_times = array('d')
         self.generate_reference_cadence()
 
         self.midi_test_notes, self.pre_octave_key_list = self.generate_test_sequence()
-        print("Generated MIDI Test Notes:", self.midi_test_notes)
-        print("Pre-Octave List:", self.pre_octave_key_list)
         return
 
-    def generate_reference_cadence(self):
-        """Generate a reference cadence based on a given key."""
-        key_note = self.solfege_to_midi['do'] + self.key  # Calculate the base note of the key
+    @classmethod
+    def standard_notes(cls):
+        """(notes, durations) a round at any preset's starting level can use.
+
+        Notes span every mode note in every key across the widest preset octave range.
+        """
+        presets = [settings.preset(name) for name in ("Easy", "Medium", "Hard", "Impossible", "Custom")]
+        octave_range = max(int(preset["octave_range"]) for preset in presets)
+        mode_notes = [note for mode in cls.modes.values() for note in mode]
+        keys = cls.key_to_adjustment.values()
+        notes = range(min(mode_notes) + min(keys), max(mode_notes) + max(keys) + 12 * (octave_range - 1) + 1)
+        return tuple(notes), tuple(sorted(set(preset["duration"] for preset in presets)))
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def reference_cadences(cls):
+        """Every (dominant, tonic) pair a round can open with, over all keys and modes."""
+        cadences = set()
+        for key in set(cls.key_to_adjustment.values()):
+            for mode in cls.modes.values():
+                cadence = cls.reference_cadence(key, tuple(mode))
+                cadences.add((cadence['dominant'], cadence['tonic']))
+        return frozenset(cadences)
+
+    def generate_reference_cadence(self, key=None, mode=None):
+        """Generate a V-I reference cadence for a key, the current one by default."""
+        return self.reference_cadence(self.key if key is None else key, self.mode if mode is None else mode)
+
+    @classmethod
+    def reference_cadence(cls, key, mode):
+        """V-I cadence for a key adjustment and mode.
+
+        Seven-note modes resolve to their own tonic triad, so minor modes get a minor I.
+        """
+        key_note = cls.solfege_to_midi['do'] + key  # Calculate the base note of the key
         dominant = (key_note - 5, key_note - 1, key_note + 2)  # Calculate dominant f notes
-        tonic = (key_note, key_note + 4, key_note + 7)  # Calculate tonic chord notes
+        if len(mode) == 7:
+            tonic = tuple(key_note + mode[degree] - mode[0] for degree in (0, 2, 4))
+        else:
+            tonic = (key_note, key_note + 4, key_note + 7)  # Calculate tonic chord notes
         return {'dominant': dominant, 'tonic': tonic}  # Return both chords as a dictionary
     
         # Function to validate user input against a pre-generated MIDI sequence
     def validate_user_input(self):
-        # Check if the entire user input list matches the pre-generated list
-        overall_match = 1 if self.pre_octave_key_list == self.user_guesses else 0
-        
-        # Check for individual note matches
-        detailed_match = [1 if self.pre_octave_key_list[i] == self.user_guesses[i] else 0 for i in range(len(self.pre_octave_key_list))]
-        self.detailed_match = detailed_match
-        
-        # Calculate the percentage of correct notes
-        print(str(self.pre_octave_key_list))
-        correct_percentage = sum(detailed_match) / len(self.pre_octave_key_list)
+        with tracer.span("validation", self.trace):
+            # Check if the entire user input list matches the pre-generated list
+            overall_match = 1 if self.pre_octave_key_list == self.user_guesses else 0
+
+            # Check for individual note matches
+            detailed_match = array('B', [1 if self.pre_octave_key_list[i] == self.user_guesses[i] else 0 for i in range(len(self.pre_octave_key_list))])
+            self.detailed_match = detailed_match
+            self.round_time = self.round_elapsed_time()
+
+            # Calculate the percentage of correct notes
+            correct_percentage = sum(detailed_match) / len(self.pre_octave_key_list)
+
+            # One cell per answered note, then re-derive the note weights from the 12x12 counts
+            for target, guess in zip(self.pre_octave_key_list, self.user_guesses):
+                self.confusion[(target - 60) % 12, (guess - 60) % 12] += 1
+            self.refresh_note_tables()
+        if self.record_stats:
+            with tracer.span("stats_write", self.trace):
+                self.stats.record_round(self.mode_name, self.key, self.difficulty_name, self.current_level,
+                                        self.pre_octave_key_list, self.user_guesses, detailed_match,
+                                        self.answer_times, self.round_time)
+        tracer.finish_round(self.trace, number_of_notes=len(self.pre_octave_key_list), key=self.key,
+                            prefetched=self.round_prefetched, correct_percentage=correct_percentage)
+        self.trace = {}
         
         local_gamepoints = self.gamepoints
         
@@ -366,6 +671,7 @@ class EarTrainingGame:
         
         self.gamepoints -= self.required_gamepoints
         self.required_gamepoints *= self.level_up_scalar
+        self.prefetcher.invalidate()  # Prefetched rounds used the old difficulty
 
     def check_for_level_up(self):
         if self.gamepoints > self.required_gamepoints:
@@ -381,99 +687,33 @@ class EarTrainingGame:
         return self.pre_octave_key_list
     
     def set_mode(self, mode):
-        print("trying to set mode")
-        try:
-            # Check if the mode exists in the self.modes dictionary
-            print("trying to change mode")
-            if mode in self.modes:
-                self.mode = self.modes.get(mode)
-                print("changed mode to " + str(mode))
-        except KeyError:
-            # Proper handling of KeyError if mode is not found in the dictionary
-            print("error: invalid mode")
+        # Unknown modes are ignored
+        if mode in self.modes:
+            self.mode = self.modes.get(mode)
+            self.mode_name = mode
+            self.refresh_note_tables()
+            self.prefetcher.invalidate()
             
     def set_difficulty(self, chosen_difficulty):
-        if chosen_difficulty == "Easy":
-            self.difficulty = self.settings_easy
-        elif chosen_difficulty == "Medium":
-            self.difficulty = self.settings_medium
-        elif chosen_difficulty == "Hard":
-            self.difficulty = self.settings_hard
-        elif chosen_difficulty == "Impossible":
-            self.difficulty = self.settings_impossible
+        if chosen_difficulty not in ("Easy", "Medium", "Hard", "Impossible"):
+            return
+        settings.refresh()  # Picks up edits to the settings file; only a stat() when it is unchanged
+        self.difficulty = dict(settings.preset(chosen_difficulty))  # Private copy of the preset
+        self.difficulty_name = chosen_difficulty
+        self.prefetcher.invalidate()
+
+    def set_key(self, key):
+        if key in self.key_to_adjustment:
+            self.key = self.key_to_adjustment[key]
+            self.prefetcher.invalidate()
+        else:
+            print("error: invalid key")
             
     
     
-def play_midi_note(self, output, note, duration):
-        duration = self.difficulty["duration"]
-        
-        """Play a single MIDI note for a specified duration in milliseconds.
-        
-        Args:
-        output: The MIDI output port to send messages.
-        note: The MIDI note number to play.
-        duration: How long the note should sound, in milliseconds.
-        """
-        output.send(mido.Message('note_on', note=note))
-        time.sleep(duration / 1000.0)  # Convert milliseconds to seconds
-        output.send(mido.Message('note_off', note=note))
-
-
-def play_chord(output, chord, duration):
-    """Play a chord (multiple notes simultaneously) for a specified duration.
-    
-    Args:
-    output: The MIDI output port to send messages.
-    chord: A tuple containing MIDI notes that make up the chord.
-    duration: How long the chord should sound, in milliseconds.
-    """
-    for note in chord:
-        output.send(mido.Message('note_on', note=note))
-    time.sleep(duration / 1000.0)
-    for note in chord:
-        output.send(mido.Message('note_off', note=note))
-
-def midi_test_notes(self, midi_test_notes, dominant, tonic, note_duration, interlude_duration):
-    """Play a sequence of two chords followed by a melody.
-    
-    Args:
-    midi_test_notes: A string with MIDI notes separated by underscores (e.g., "62_65_64").
-    dominant: A tuple representing the dominant chord to be played.
-    tonic: A tuple representing the tonic chord to be played.
-    note_duration: Duration for each note or chord in milliseconds.
-    interlude_duration: Milliseconds to wait between the chord section and the melody section.
-    """
-
-    midi_test_notes = self.midi_test_notes
-    dominant = self.dominant["dominant"]
-    tonic = self.tonic["tonic"]
-    note_duration = self.difficulty["duration"]
-    interlude_duration = 1000
-
-    output = mido.open_output()  # Open the default MIDI output
-    
-    # Play the dominant chord
-    play_chord(output, dominant, note_duration)
-    
-    # Wait before playing the tonic chord
-    time.sleep(note_duration / 1000.0)  # Ensure there is a break between chords
-    
-    # Play the tonic chord
-    play_chord(output, tonic, note_duration)
-    
-    # Wait between chords and midi test notes
-    time.sleep(interlude_duration / 1000.0)
-    
-    # Play the midi test notes
-    for note in map(int, midi_test_notes.split('_')):
-        play_midi_note(output, note, note_duration)
-    
-    output.close()
-
-
-	
 def main():
-    game = EarTrainingGame()  # Create an instance of the game
+    tracer.enable_from_environment()
+    game = EarTrainingGame(midi_player=midi_player_from_environment())  # Create an instance of the game
     game.start_game()  # Start the game clock
 
 
@@ -2,6 +2,8 @@ import tkinter as tk
 import EarTraining as backend
 from EarTraining import EarTrainingGame
 import os
+from tracing import tracer
+from midiplayer import midi_player_from_environment
 
 
 class EarTrainerApp(tk.Tk):
@@ -64,9 +66,45 @@ class EarTrainerApp(tk.Tk):
     def show_main_menu(self):
         self.clear_frame(self.main_frame)
         self.create_button(self.main_frame, "Play", self.show_tonality_screen).pack(pady=20)
-        self.create_button(self.main_frame, "Stats", lambda: None).pack(pady=20)
+        self.create_button(self.main_frame, "Stats", self.show_stats_screen).pack(pady=20)
         self.create_button(self.main_frame, "Sandbox", lambda: None).pack(pady=20)
 
+    def show_stats_screen(self):
+        self.clear_frame(self.main_frame)
+        stats_frame = tk.Frame(self.main_frame, bg='#3c3f41', padx=10, pady=10)
+        stats_frame.pack(pady=20)
+
+        def stats_label(text, row, column=0, columnspan=1):
+            tk.Label(stats_frame, text=text, font=('Arial', 12), bg='#3c3f41', fg='white').grid(
+                row=row, column=column, columnspan=columnspan, padx=10, pady=2, sticky='w')
+
+        summary = backend.stats.summary()
+        if not summary["rounds"]:
+            stats_label("No rounds played yet", 0)
+        else:
+            stats_label(f"Rounds: {summary['rounds']}   Notes: {summary['notes']}   "
+                        f"Accuracy: {summary['accuracy']:.0%}", 0, columnspan=3)
+
+            # Accuracy per solfege degree, mean response time per note
+            stats_label("Degree", 1)
+            stats_label("Accuracy", 1, 1)
+            stats_label("Response time", 1, 2)
+            for row, (solfege, (attempts, accuracy, response_time)) in enumerate(backend.stats.accuracy_by_degree().items(), 2):
+                stats_label(solfege.capitalize(), row)
+                stats_label(f"{accuracy:.0%} of {attempts}", row, 1)
+                stats_label("-" if response_time is None else f"{response_time:.2f} s", row, 2)
+
+            # Accuracy per mode, and per day over the last two weeks
+            row = 15
+            for mode, (rounds, accuracy, perfect) in backend.stats.accuracy_by_mode().items():
+                stats_label(f"{mode}: {accuracy:.0%} over {rounds} rounds, {perfect:.0%} perfect", row, columnspan=3)
+                row += 1
+            for day, rounds, accuracy in backend.stats.accuracy_over_time(days=14):
+                stats_label(f"{day}: {accuracy:.0%} over {rounds} rounds", row, columnspan=3)
+                row += 1
+
+        self.create_button(self.main_frame, "Back", self.show_main_menu).pack(pady=20)
+
     def show_tonality_screen(self):
         self.clear_frame(self.main_frame)
         tonalities = ["Ionian", "Aeolian", "Chromatic", "Modes"]
@@ -227,7 +265,6 @@ class EarTrainerApp(tk.Tk):
 
     def validate_inputs(self, event=None):
         filled = all(entry.get().strip() for entry in self.inputs)
-        print(filled)
         if filled:
             self.check_button.pack(side=tk.LEFT)
         else:
@@ -237,32 +274,17 @@ class EarTrainerApp(tk.Tk):
 
     def check_answers(self):
         user_input_values = [entry.get() for entry in self.inputs]
-        print("User Input Values:", user_input_values)
         
         user_input_midi = solfege_to_midi(user_input_values)
-        print("MIDI Notes:", user_input_midi)
         
         for midi_notes in user_input_midi:
             backend.user_guesses.append(midi_notes)
         
         backend.validate_user_input()
         detailed_answers = backend.get_detailed_match()
-        print("Detailed Answers:", detailed_answers)
-
-        print("Length of inputs:", len(self.inputs))
-        print("Length of answers:", len(self.answers))
-        print("Length of detailed answers:", len(detailed_answers))
-
-        print("Zipping contents:", list(zip(self.inputs, self.answers, detailed_answers)))
-
 
         try:
             for input_entry, answer_entry, is_correct in zip(self.inputs, self.answers, detailed_answers):
-                
-                print("Type of input_entry:", type(input_entry))
-                print("Type of answer_entry:", type(answer_entry))
-                
-                
                 if is_correct:
                     input_entry.config(bg='light green')
                     answer_entry.config(state='normal')
@@ -342,6 +364,7 @@ def solfege_to_midi(solfege):
     return [solfege_map[note] for note in solfege if note in solfege_map]
 
 if __name__ == "__main__":
-    backend = EarTrainingGame()  # Create an instance of the EarTrainingGame class
+    tracer.enable_from_environment()
+    backend = EarTrainingGame(adaptive=True, midi_player=midi_player_from_environment())  # Create an instance of the EarTrainingGame class
     app = EarTrainerApp(backend)  # Pass the backend instance to the frontend class
     app.mainloop()
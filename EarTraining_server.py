@@ -0,0 +1,331 @@
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import bottle
+
+from EarTraining import EarTrainingGame
+from soundmodule import stream_wav_bytes, QUALITY_TIERS
+from tracing import tracer
+
+
+SESSION_IDLE_TIMEOUT = 30 * 60  # Seconds without a request before a session is reaped
+PREFETCH_WORKERS = 4  # Threads shared by every session for building upcoming rounds
+
+
+# Shared by all sessions; its threads are only started once rounds are prefetched
+prefetch_pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+# Prefetches one round at a time as a task on a shared pool instead of a thread per game
+class PooledRoundPrefetcher:
+
+    def __init__(self, build_round, executor=prefetch_pool):
+        self.build_round = build_round  # Callable returning a ready-to-play round
+        self.executor = executor
+        self.future = None  # The round being built, or ready to be taken
+        self.running = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start prefetching the next round."""
+        with self.lock:
+            self.running = True
+            self._submit()
+
+    def stop(self):
+        """Stop prefetching and drop the pending round."""
+        with self.lock:
+            self.running = False
+            self._discard()
+
+    def invalidate(self):
+        """Discard the pending round, e.g. after the mode, key or difficulty changed."""
+        with self.lock:
+            self._discard()
+            self._submit()
+
+    def get(self):
+        """Return the prefetched round if it is ready, or None."""
+        with self.lock:
+            future = self.future
+            if future is None or not future.done():
+                return None
+            self.future = None
+            self._submit()
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"An error occurred while prefetching: {e}")
+            return None
+
+    def _submit(self):
+        if self.running and self.future is None:
+            self.future = self.executor.submit(self.build_round)
+
+    def _discard(self):
+        # A round already being built finishes on the pool, but its result is never used
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+
+# Game used by the server: audio is sent to clients instead of played locally
+class HeadlessEarTrainingGame(EarTrainingGame):
+    __slots__ = ()
+
+    def __init__(self, quality="high", executor=prefetch_pool):
+        super().__init__(in_memory_playback=True, export_audio=False, autoplay=False, prefetch_depth=1,
+                         record_stats=False, quality=quality)
+        self.prefetcher = PooledRoundPrefetcher(self.build_round, executor)
+
+
+# Thread-safe table of independent game sessions keyed by session id
+class SessionTable:
+
+    def __init__(self, max_sessions=1000, quality="high", idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.quality = quality  # Audio quality tier of every new session
+        self.idle_timeout = idle_timeout  # Seconds a session may go unused before it is reaped
+        self.sessions = {}
+        self.last_access = {}  # Session id -> time.monotonic() of its latest request
+        self.lock = threading.Lock()
+
+    def create(self):
+        """Create a new game session and return its id, or None if the table is full.
+
+        Idle sessions are reaped first, so abandoned clients do not hold slots.
+        """
+        self.reap()
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                return None
+            session_id = uuid.uuid4().hex
+            self.sessions[session_id] = HeadlessEarTrainingGame(self.quality)
+            self.last_access[session_id] = time.monotonic()
+            return session_id
+
+    def get(self, session_id):
+        """Return a session's game and mark it as used, or None if it does not exist."""
+        with self.lock:
+            game = self.sessions.get(session_id)
+            if game is not None:
+                self.last_access[session_id] = time.monotonic()
+            return game
+
+    def remove(self, session_id):
+        """Remove a session, stopping its game if it was running."""
+        with self.lock:
+            game = self.sessions.pop(session_id, None)
+            self.last_access.pop(session_id, None)
+        if game is not None and game.running:
+            game.stop_game()
+
+    def reap(self):
+        """Remove every session idle for longer than idle_timeout and return their ids."""
+        deadline = time.monotonic() - self.idle_timeout
+        with self.lock:
+            expired = [session_id for session_id, accessed in self.last_access.items() if accessed < deadline]
+        for session_id in expired:
+            self.remove(session_id)
+        return expired
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sessions)
+
+
+def audio_to_wav_bytes(waveform, sample_rate=44100):
+    """Encode a rendered int16 buffer as WAV file bytes."""
+    return b"".join(stream_wav_bytes([waveform], len(waveform), sample_rate))
+
+
+def game_state(game):
+    return {
+        "running": game.running,
+        "number_of_notes": game.get_number_of_notes(),
+        "guesses": list(game.user_guesses),
+        "gamepoints": game.gamepoints,
+        "required_gamepoints": game.required_gamepoints,
+        "current_level": game.current_level,
+        "elapsed_time": game.elapsed_time
+    }
+
+
+def handle_action(game, action, payload):
+    """Run one game operation and return a JSON-serializable reply.
+
+    Raises ValueError for unknown actions or invalid arguments.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object")
+    if action == "set_mode":
+        mode = payload.get("mode")
+        # Empty modes such as "Custom" have no notes to build a round from
+        if not isinstance(mode, str) or not game.modes.get(mode):
+            raise ValueError("invalid mode")
+        game.set_mode(mode)
+    elif action == "set_difficulty":
+        if payload.get("difficulty") not in ("Easy", "Medium", "Hard", "Impossible"):
+            raise ValueError("invalid difficulty")
+        game.set_difficulty(payload["difficulty"])
+    elif action == "set_key":
+        if not isinstance(payload.get("key"), str) or payload["key"] not in game.key_to_adjustment:
+            raise ValueError("invalid key")
+        game.set_key(payload["key"])
+    elif action == "start":
+        if game.running:
+            game.restart_game()
+        else:
+            game.start_game()
+    elif action == "next":
+        game.restart_game()
+    elif action == "guess":
+        guesses = payload.get("guesses", [payload.get("solfege")])
+        if not isinstance(guesses, list):
+            raise ValueError("guesses must be a list")
+        if not all(isinstance(solfege, str) and solfege in game.solfege_to_midi for solfege in guesses):
+            raise ValueError("invalid solfege")
+        for solfege in guesses:
+            game.add_user_guess(solfege)
+    elif action == "remove_guess":
+        game.remove_user_guess()
+    elif action == "validate":
+        if not game.pre_octave_key_list:
+            raise ValueError("no round generated yet")
+        if len(game.user_guesses) != len(game.pre_octave_key_list):
+            raise ValueError("expected %d guesses" % len(game.pre_octave_key_list))
+        overall_match, detailed_match, gamepoints = game.validate_user_input()
+        reply = game_state(game)
+        reply.update({"overall_match": overall_match, "detailed_match": list(detailed_match),
+                      "answer": list(game.pre_octave_key_list)})
+        return reply
+    elif action != "state":
+        raise ValueError("unknown action: %s" % action)
+    return game_state(game)
+
+
+def create_app(sessions=None):
+    """Build the bottle application serving the given session table."""
+    sessions = SessionTable() if sessions is None else sessions
+    app = bottle.Bottle()
+    app.sessions = sessions
+
+    def json_error(status, message):
+        return bottle.HTTPResponse(status=status, body=json.dumps({"error": message}),
+                                   headers={"Content-Type": "application/json"})
+
+    def lookup(session_id):
+        game = sessions.get(session_id)
+        if game is None:
+            raise json_error(404, "unknown session")
+        return game
+
+    @app.post("/session")
+    def create_session():
+        session_id = sessions.create()
+        if session_id is None:
+            return json_error(503, "session limit reached")
+        return {"session": session_id}
+
+    @app.delete("/session/<session_id>")
+    def delete_session(session_id):
+        lookup(session_id)
+        sessions.remove(session_id)
+        return {"session": session_id}
+
+    @app.get("/session/<session_id>/audio")
+    def get_audio(session_id):
+        game = lookup(session_id)
+        if game.audio_buffer is None:
+            return json_error(409, "no round generated yet")
+        bottle.response.content_type = "audio/wav"
+        return audio_to_wav_bytes(game.audio_buffer, game.sample_rate)
+
+    @app.post("/session/<session_id>/<action>")
+    def post_action(session_id, action):
+        game = lookup(session_id)
+        try:
+            return handle_action(game, action, bottle.request.json or {})
+        except ValueError as e:
+            return json_error(400, str(e))
+
+    @app.get("/ws")
+    def websocket():
+        # Each WebSocket connection owns one session for its lifetime
+        ws = bottle.request.environ.get("wsgi.websocket")
+        if ws is None:
+            return json_error(400, "expected a WebSocket request")
+        session_id = sessions.create()
+        if session_id is None:
+            ws.send(json.dumps({"error": "session limit reached"}))
+            return
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    break
+                game = sessions.get(session_id)
+                if game is None:
+                    ws.send(json.dumps({"error": "session expired"}))
+                    break
+                try:
+                    request = json.loads(message)
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                    action = request.get("action")
+                    if action == "audio":
+                        if game.audio_buffer is None:
+                            raise ValueError("no round generated yet")
+                        ws.send(audio_to_wav_bytes(game.audio_buffer, game.sample_rate), binary=True)
+                        continue
+                    reply = handle_action(game, action, request)
+                except ValueError as e:
+                    reply = {"error": str(e)}
+                ws.send(json.dumps(reply))
+        finally:
+            sessions.remove(session_id)
+
+    return app
+
+
+def serve(host="127.0.0.1", port=8080, max_sessions=1000, quality="high", idle_timeout=SESSION_IDLE_TIMEOUT):
+    """Serve the game over HTTP and WebSocket with gevent."""
+    import gevent
+    from gevent import pywsgi
+    from geventwebsocket.handler import WebSocketHandler
+
+    sessions = SessionTable(max_sessions, quality, idle_timeout)
+    app = create_app(sessions)
+    server = pywsgi.WSGIServer((host, port), app, handler_class=WebSocketHandler)
+
+    def reap_forever():
+        # Also reaped on create; this frees abandoned sessions while nobody new connects
+        while True:
+            gevent.sleep(max(1.0, idle_timeout / 4))
+            sessions.reap()
+
+    gevent.spawn(reap_forever)
+    print(f"Serving EarTraining on http://{host}:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-session EarTraining server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--idle-timeout", type=float, default=SESSION_IDLE_TIMEOUT,
+                        help="seconds without a request before a session is dropped")
+    parser.add_argument("--quality", choices=sorted(QUALITY_TIERS), default="high",
+                        help="audio sample rate tier; lower tiers send less data per round")
+    args = parser.parse_args()
+    tracer.enable_from_environment()
+    serve(args.host, args.port, args.max_sessions, args.quality, args.idle_timeout)
+
+
+if __name__ == "__main__":
+    main()
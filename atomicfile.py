@@ -0,0 +1,32 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path, suffix=".tmp"):
+    """Yield a temporary path next to path, renamed over path once the block succeeds.
+
+    Readers only ever see the old file or the complete new one; on failure
+    the temporary file is removed and path is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(descriptor)
+    try:
+        yield temporary_path
+        os.replace(temporary_path, path)
+    except BaseException:
+        try:
+            os.unlink(temporary_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def atomic_write(path, mode='wb', suffix=".tmp"):
+    """Like atomic_path, but yield the temporary file opened with mode."""
+    with atomic_path(path, suffix) as temporary_path:
+        with open(temporary_path, mode) as file:
+            yield file
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+
+from atomicfile import atomic_write
+from soundmodule import WavStreamWriter, SYNTHESIS_VERSION
+
+
+# Default location and size cap, in bytes, of the on-disk audio cache
+AUDIO_CACHE_DIRECTORY = "audio_cache"
+AUDIO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class AudioCache:
+    """Content-addressed on-disk cache of rendered rounds.
+
+    Files are named after a hash of the parameters that produced them, so
+    identical exercises map to the same WAV. Writes go to a temporary file
+    that is renamed into place, so readers only ever see complete files.
+    A file's modification time doubles as its last-use time for LRU
+    eviction once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIRECTORY, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, parameters):
+        """Hash render parameters (a JSON-serializable dict) into a cache key."""
+        parameters = dict(parameters, synthesis_version=SYNTHESIS_VERSION)
+        encoded = json.dumps(parameters, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".wav")
+
+    def get(self, parameters):
+        """Return the cached file path for parameters, or None on a miss."""
+        path = self.path(self.key(parameters))
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        except PermissionError:
+            pass  # Another process holds the file; it still exists
+        return path
+
+    def put(self, parameters, chunks, sample_rate=44100):
+        """Atomically store a WAV streamed from int16 chunks and return its path."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(self.key(parameters))
+        with atomic_write(path) as file:
+            with WavStreamWriter(file, sample_rate) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Delete least recently used files until the cache fits in max_bytes."""
+        entries = []
+        total_bytes = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".wav"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total_bytes += stat.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                continue  # Still open for reading elsewhere; try again next time
+            total_bytes -= size
+
+    def clear(self):
+        """Remove every cached file."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError as e:
+                print('Failed to delete %s. Reason: %s' % (name, e))
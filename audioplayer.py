@@ -0,0 +1,124 @@
+import threading
+import time
+
+import numpy as np
+
+
+# Mixer settings matched to the mono int16 audio the game renders at its default quality
+MIXER_FREQUENCY = 44100
+MIXER_SIZE = -16  # Signed 16-bit samples
+MIXER_CHANNELS = 1
+MIXER_BUFFER = 512  # Samples per device buffer; smaller means lower output latency
+
+
+def _mixer():
+    """Import pygame on first use; it is slow to load and prints a banner."""
+    import pygame
+    return pygame.mixer
+
+
+# Owns the pygame mixer: initialized once, with a reserved channel per playback role
+class AudioPlayer:
+
+    # Reserved channels: reference chord, test notes and UI feedback sounds
+    roles = ("reference", "test", "feedback")
+
+    def __init__(self, frequency=MIXER_FREQUENCY, size=MIXER_SIZE, channels=MIXER_CHANNELS, buffer=MIXER_BUFFER):
+        self.frequency = frequency
+        self.size = size
+        self.channels = channels
+        self.buffer = buffer
+        self.channel_pool = {}
+        self.on_latency = None  # Optional callback receiving latency_report() after each play
+        self.last_start_delay = None  # Seconds spent handing the last sound to its channel
+        self.lock = threading.Lock()
+
+    def init(self, frequency=None):
+        """Initialize the mixer on first use; later calls cost a dictionary lookup.
+
+        Passing a frequency other than the current one reopens the mixer at that rate.
+        """
+        mixer = _mixer()
+        if self.channel_pool and mixer.get_init() and frequency in (None, self.frequency):
+            return
+        with self.lock:
+            if frequency not in (None, self.frequency):
+                self.frequency = frequency
+                self.channel_pool = {}
+                mixer.quit()
+            if self.channel_pool and mixer.get_init():
+                return
+            if not mixer.get_init():
+                # allowedchanges=0 makes SDL convert to the device format instead of handing us another one
+                mixer.init(frequency=self.frequency, size=self.size, channels=self.channels,
+                       buffer=self.buffer, allowedchanges=0)
+            mixer.set_num_channels(max(mixer.get_num_channels(), len(self.roles)))
+            mixer.set_reserved(len(self.roles))
+            self.channel_pool = {role: mixer.Channel(index) for index, role in enumerate(self.roles)}
+
+    def quit(self):
+        with self.lock:
+            self.channel_pool = {}
+            _mixer().quit()
+
+    def make_sound(self, waveform):
+        """Wrap a mono int16 buffer in a mixer Sound without going through disk."""
+        self.init()
+        _, _, channels = _mixer().get_init()
+        if channels > 1:
+            # The mixer was set up elsewhere with more channels; duplicate the mono signal
+            waveform = np.repeat(waveform[:, np.newaxis], channels, axis=1)
+        return _mixer().Sound(buffer=np.ascontiguousarray(waveform))
+
+    def play(self, sound, role="test"):
+        """Play a Sound, int16 buffer or file path on the channel reserved for role."""
+        self.init()
+        if isinstance(sound, np.ndarray):
+            sound = self.make_sound(sound)
+        elif isinstance(sound, str):
+            sound = _mixer().Sound(sound)
+        start = time.perf_counter()
+        self.channel_pool[role].play(sound)
+        self.last_start_delay = time.perf_counter() - start
+        if self.on_latency is not None:
+            self.on_latency(self.latency_report())
+        return sound
+
+    def stop(self, role=None):
+        """Stop one role's channel, or every channel when role is None."""
+        mixer = _mixer()
+        if not mixer.get_init():
+            return
+        if role is None:
+            mixer.stop()
+        elif role in self.channel_pool:
+            self.channel_pool[role].stop()
+
+    def latency_report(self):
+        """Actual mixer format and the output latency it implies, in milliseconds."""
+        initialized = _mixer().get_init()
+        if not initialized:
+            return None
+        frequency, size, channels = initialized
+        return {
+            "frequency": frequency,
+            "size": size,
+            "channels": channels,
+            "buffer_samples": self.buffer,
+            "buffer_latency_ms": self.buffer / frequency * 1000,
+            "start_delay_ms": None if self.last_start_delay is None else self.last_start_delay * 1000,
+            "matches_render_format": frequency == self.frequency and channels == self.channels
+        }
+
+
+_player = None
+_player_lock = threading.Lock()
+
+
+def get_audio_player():
+    """Return the process-wide AudioPlayer; the mixer itself is global to pygame."""
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = AudioPlayer()
+        return _player
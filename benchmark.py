@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+import numpy as np
+
+import soundmodule
+from audiocache import AudioCache
+from chordbank import ChordBank
+from notebank import NoteBank
+from settingsstore import settings
+from statsstore import StatsStore
+from EarTraining import EarTrainingGame
+
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_golden.json")
+PRESETS = ["Easy", "Medium", "Hard", "Impossible"]
+LEVEL_DEPTHS = [0, 2, 5]
+SEED = 1234
+IMPORT_MODULES = ["soundmodule", "EarTraining", "EarTraining_GUI"]
+
+
+def buffer_hash(waveform):
+    """Hash a rendered buffer together with its dtype and shape."""
+    waveform = np.ascontiguousarray(waveform)
+    digest = hashlib.sha256()
+    digest.update(("%s%s" % (waveform.dtype.str, waveform.shape)).encode())
+    digest.update(waveform.tobytes())
+    return digest.hexdigest()
+
+
+def time_call(function, repeat):
+    """Run function repeat times and return timing statistics in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings)
+    }
+
+
+def measure_import_time(module, repeat):
+    """Median cold import time of module in milliseconds, each run in a fresh interpreter."""
+    timings = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                                   cwd=os.path.dirname(GOLDEN_FILE), capture_output=True, text=True, check=True)
+        # The last line is the requested module itself; its cumulative time is in microseconds
+        cumulative = completed.stderr.strip().splitlines()[-1].split("|")[1]
+        timings.append(int(cumulative) / 1000)
+    return statistics.median(timings)
+
+
+def make_game(preset, depth, cache_directory, quality="high"):
+    """A headless game at the given preset after depth level-ups."""
+    chord_bank = ChordBank(EarTrainingGame.reference_cadences(), soundmodule.QUALITY_TIERS[quality],
+                           os.path.join(os.path.dirname(cache_directory), "chord_bank"))
+    notes, durations = EarTrainingGame.standard_notes()
+    note_bank = NoteBank(notes, durations, soundmodule.QUALITY_TIERS[quality],
+                         os.path.join(os.path.dirname(cache_directory), "note_bank"))
+    chord_bank.open()  # Both banks are built once per sample rate, outside the timed calls
+    note_bank.open()
+    game = EarTrainingGame(autoplay=False, audio_cache=AudioCache(cache_directory),
+                           stats_store=StatsStore(cache_directory + ".sqlite3"), quality=quality,
+                           chord_bank=chord_bank, note_bank=note_bank)
+    game.set_difficulty(preset)
+    game.set_mode("Ionian")
+    for _ in range(depth):
+        game.level_up()
+    return game
+
+
+def seeded_round(game, seed):
+    random.seed(seed)
+    return game.build_round()
+
+
+def run_benchmarks(repeat, workdir):
+    """Time every hot path and collect golden hashes of what they render."""
+    results = []
+    golden = {}
+    settings.path = os.path.join(workdir, "settings.txt")  # Default presets, whatever the local settings file says
+
+    def record(name, parameters, function, output=None):
+        entry = {"name": name, "parameters": parameters}
+        entry.update(time_call(function, repeat))
+        results.append(entry)
+        if output is not None:
+            golden[name + json.dumps(parameters, sort_keys=True)] = buffer_hash(output)
+
+    record("midi_to_frequency", {"notes": 128},
+           lambda: [soundmodule.midi_to_frequency(note) for note in range(128)])
+
+    for duration in (0.5, 1.0, 2.0):
+        parameters = {"midi_note": 69, "duration": duration}
+        frequency = soundmodule.midi_to_frequency(69)
+        record("render_note", parameters, lambda: soundmodule.render_note(frequency, duration),
+               soundmodule.render_note(frequency, duration))
+        soundmodule.note_cache.clear()
+        soundmodule.synthesize_note(frequency, duration)
+        record("synthesize_note_cached", parameters, lambda: soundmodule.synthesize_note(frequency, duration))
+        record("create_note", parameters, lambda: soundmodule.create_note(frequency, duration),
+               soundmodule.create_note(frequency, duration))
+
+    for mode_name in ("Ionian", "Aeolian", "Chromatic"):
+        mode = EarTrainingGame.modes[mode_name]
+        record("generate_chord", {"mode": mode_name, "duration": 2},
+               lambda: soundmodule.generate_chord(60, 2, mode), soundmodule.generate_chord(60, 2, mode))
+
+    cadence = [(55, 59, 62), (60, 64, 67)]
+    record("synthesize_progression", {"chords": 2, "chord_duration": 1.0},
+           lambda: soundmodule.synthesize_progression(cadence, 1.0), soundmodule.synthesize_progression(cadence, 1.0))
+
+    previous_directory = os.getcwd()
+    os.chdir(workdir)  # generate_sequence writes into ./test_file_folder
+    try:
+        for num_notes in (4, 8):
+            parameters = {"sound_type": "scale", "num_notes": num_notes}
+
+            def generate_sequence():
+                return soundmodule.generate_sequence("scale", 0.4, 0.5, 0.3, 60, num_notes, 12)
+
+            record("generate_sequence", parameters, generate_sequence)
+            random.seed(SEED)
+            filepath, _ = generate_sequence()
+            with open(filepath, "rb") as file:
+                golden["generate_sequence" + json.dumps(parameters, sort_keys=True)] = hashlib.sha256(file.read()).hexdigest()
+    finally:
+        os.chdir(previous_directory)
+
+    for preset in PRESETS:
+        for depth in LEVEL_DEPTHS:
+            parameters = {"preset": preset, "level_depth": depth}
+            cache_directory = os.path.join(workdir, "cache_%s_%d" % (preset, depth))
+            game = make_game(preset, depth, cache_directory)
+            round_data = seeded_round(game, SEED)
+            notes = round_data["midi_test_notes_list"]
+
+            record("render_audio", parameters, lambda: game.render_audio(notes), game.render_audio(notes))
+
+            def list_to_audiofile():
+                game.audio_cache.clear()
+                return game.list_to_audiofile(notes)
+
+            record("list_to_audiofile", parameters, list_to_audiofile)
+            record("generate_test_sequence", parameters, game.generate_test_sequence)
+
+            def validate_user_input():
+                game.user_guesses = array('h', game.pre_octave_key_list)
+                return game.validate_user_input()
+
+            record("validate_user_input", parameters, validate_user_input)
+            golden["build_round" + json.dumps(parameters, sort_keys=True)] = buffer_hash(round_data["audio_buffer"])
+
+    for quality in sorted(soundmodule.QUALITY_TIERS):
+        parameters = {"preset": "Hard", "quality": quality}
+        game = make_game("Hard", 0, os.path.join(workdir, "cache_quality_%s" % quality), quality)
+        notes = seeded_round(game, SEED)["midi_test_notes_list"]
+        record("render_audio_quality", parameters, lambda: game.render_audio(notes), game.render_audio(notes))
+
+    return results, golden
+
+
+def compare_golden(golden, expected):
+    """Return the names whose hash differs from, or is missing in, the golden file."""
+    return sorted(name for name, digest in golden.items() if expected.get(name) != digest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio and game hot paths")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite %s" % os.path.basename(GOLDEN_FILE))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        results, golden = run_benchmarks(args.repeat, workdir)
+
+    if args.update_golden:
+        with open(GOLDEN_FILE, "w") as file:
+            json.dump(golden, file, indent=2, sort_keys=True)
+            file.write("\n")
+        mismatches = []
+    else:
+        with open(GOLDEN_FILE) as file:
+            mismatches = compare_golden(golden, json.load(file))
+
+    import_times_ms = {module: measure_import_time(module, args.repeat) for module in IMPORT_MODULES}
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "synthesis_version": soundmodule.SYNTHESIS_VERSION,
+        "import_times_ms": import_times_ms,
+        "results": results,
+        "golden_mismatches": mismatches
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if mismatches:
+        print("Rendered audio changed for: " + ", ".join(mismatches), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from memorybank import MemoryBank, shared_bank
+from soundmodule import synthesize_progression, SYNTHESIS_VERSION, WAVETABLE_BITS
+
+
+# Where banks are written, one .npy file and index per sample rate
+CHORD_BANK_DIRECTORY = "chord_bank"
+CADENCE_CHORD_DURATION = 1.0  # Seconds per chord of the reference cadence
+CADENCE_FADE_DURATION = 0.1
+
+
+class ChordBank(MemoryBank):
+    """Every reference cadence rendered once into a memory-mapped bank.
+
+    Row i of the bank holds the i-th cadence in sorted order.
+    """
+
+    file_prefix = "cadences"
+
+    def __init__(self, cadences, sample_rate=44100, directory=CHORD_BANK_DIRECTORY):
+        super().__init__(sample_rate, directory)
+        self.cadences = sorted(set(cadences))  # (dominant, tonic) pairs of MIDI note tuples
+
+    def parameters(self):
+        return {
+            "synthesis_version": SYNTHESIS_VERSION,
+            "wavetable_bits": WAVETABLE_BITS,
+            "sample_rate": self.sample_rate,
+            "chord_duration": CADENCE_CHORD_DURATION,
+            "fade_duration": CADENCE_FADE_DURATION,
+            "cadences": [[list(dominant), list(tonic)] for dominant, tonic in self.cadences]
+        }
+
+    def layout(self):
+        # Rows follow self.cadences, which the parameters already record
+        return (len(self.cadences), 2 * int(self.sample_rate * CADENCE_CHORD_DURATION)), None
+
+    def render(self, bank, entries):
+        for row, (dominant, tonic) in enumerate(self.cadences):
+            bank[row] = synthesize_progression([dominant, tonic], CADENCE_CHORD_DURATION, self.sample_rate,
+                                               fade_duration=CADENCE_FADE_DURATION)
+
+    def lookup_table(self, entries):
+        return {cadence: row for row, cadence in enumerate(self.cadences)}
+
+    def cadence(self, dominant, tonic):
+        """Read-only waveform of a cadence, or None if the bank does not hold it."""
+        bank = self.open()
+        row = self.entries.get((tuple(dominant), tuple(tonic)))
+        if row is None:
+            return None
+        return bank[row]
+
+
+def get_chord_bank(cadences, sample_rate=44100, directory=CHORD_BANK_DIRECTORY):
+    """Return the process-wide bank for these cadences, sample rate and directory."""
+    return shared_bank(ChordBank, tuple(sorted(set(cadences))), sample_rate, directory)
@@ -0,0 +1,205 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from atomicfile import atomic_write
+from EarTraining import EarTrainingGame
+from sequencegenerator import generate_test_sequences
+from soundmodule import write_wav_stream, QUALITY_TIERS, SYNTHESIS_VERSION
+from settingsstore import settings
+
+
+DIFFICULTIES = ["Easy", "Medium", "Hard", "Impossible"]
+EXERCISES_PER_TASK = 25  # Exercises rendered per pool task
+PACK_DESCRIPTOR = "pack.json"  # Parameters the WAVs in an output directory were rendered with
+MIDI_TO_SOLFEGE = {midi: solfege for solfege, midi in EarTrainingGame.solfege_to_midi.items()}
+
+_game = None  # One headless game per worker process
+
+
+def exercise_seed(seed, mode, key, difficulty):
+    """Generator for one (mode, key, difficulty) group, independent of which other groups are exported."""
+    spawn_key = (list(EarTrainingGame.modes).index(mode), key + 6, DIFFICULTIES.index(difficulty))
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+
+
+def plan_exercises(modes, key_names, difficulties, count, seed, presets=None):
+    """Every exercise of the pack as a manifest row, in a deterministic order.
+
+    presets maps difficulty names to presets, read from the settings store by default.
+    """
+    if presets is None:
+        presets = {difficulty: dict(settings.preset(difficulty)) for difficulty in difficulties}
+    rows = []
+    for mode in modes:
+        for key_name in key_names:
+            key = EarTrainingGame.key_to_adjustment[key_name]
+            for difficulty in difficulties:
+                preset = presets[difficulty]
+                pre_octave, adjusted = generate_test_sequences(
+                    EarTrainingGame.modes[mode], preset["number_of_notes"], preset["octave_range"], key, count,
+                    exercise_seed(seed, mode, key, difficulty))
+                directory = os.path.join(mode.replace(" ", "_"), key_name, difficulty)
+                for index in range(count):
+                    rows.append({
+                        "file": os.path.join(directory, "%05d.wav" % index),
+                        "mode": mode,
+                        "key": key_name,
+                        "difficulty": difficulty,
+                        "duration": preset["duration"],
+                        "midi_notes": [int(note) for note in adjusted[index]],
+                        "pre_octave_key_list": [int(note) for note in pre_octave[index]],
+                        "solfege": [MIDI_TO_SOLFEGE[int(note)] for note in pre_octave[index]]
+                    })
+    return rows
+
+
+def _init_worker(quality):
+    global _game
+    _game = EarTrainingGame(autoplay=False, record_stats=False, prefetch_depth=0, quality=quality)
+
+
+def _render_task(task):
+    """Render one task's exercises, skipping files left complete by an earlier run."""
+    output, silence_duration, rows = task
+    rendered = 0
+    for row in rows:
+        path = os.path.join(output, row["file"])
+        if os.path.exists(path):
+            continue
+        _game.mode = _game.modes[row["mode"]]
+        _game.key = _game.key_to_adjustment[row["key"]]
+        _game.difficulty = dict(_game.difficulty, duration=row["duration"])
+        chunks, _ = _game.stream_audio(row["midi_notes"], silence_duration)
+
+        # Written under a temporary name and renamed, so an interrupted run never leaves a partial WAV
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as file:
+            write_wav_stream(file, chunks, _game.sample_rate)
+        rendered += 1
+    return len(rows), rendered
+
+
+def pack_descriptor(seed, count, quality, presets, silence_duration):
+    """Everything besides the selection of modes, keys and difficulties that determines a pack's files."""
+    return {
+        "seed": seed,
+        "count": count,
+        "quality": quality,
+        "presets": presets,
+        "space_duration": silence_duration,
+        "synthesis_version": SYNTHESIS_VERSION
+    }
+
+
+def read_pack_descriptor(output):
+    """The descriptor of an earlier export into output, or None if there was none."""
+    try:
+        with open(os.path.join(output, PACK_DESCRIPTOR)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def remove_rendered(output, rows):
+    """Delete the WAVs of rows and of the previous manifest, so they are all rendered again."""
+    files = {row["file"] for row in rows}
+    try:
+        with open(os.path.join(output, "manifest.json")) as file:
+            files.update(row["file"] for row in json.load(file))
+    except (FileNotFoundError, ValueError):
+        pass
+    for name in files:
+        try:
+            os.unlink(os.path.join(output, name))
+        except FileNotFoundError:
+            pass
+
+
+def write_manifest(output, rows):
+    """Write the answers as manifest.json and manifest.csv."""
+    with open(os.path.join(output, "manifest.json"), "w") as file:
+        json.dump(rows, file, indent=1)
+    with open(os.path.join(output, "manifest.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["file", "mode", "key", "difficulty", "midi_notes", "pre_octave_key_list", "solfege"])
+        for row in rows:
+            writer.writerow([row["file"], row["mode"], row["key"], row["difficulty"],
+                             " ".join(map(str, row["midi_notes"])), " ".join(map(str, row["pre_octave_key_list"])),
+                             " ".join(row["solfege"])])
+
+
+def export_pack(output, modes, key_names, difficulties, count, seed=0, workers=None, quality="high", rerender=False):
+    """Render count exercises per (mode, key, difficulty) into output across a process pool.
+
+    Exercises and audio depend only on the pack descriptor, which is stored
+    in output, so rerunning after an interruption renders just the missing
+    files. Resuming with a different descriptor raises ValueError, unless
+    rerender is set, in which case every file is rendered again.
+    Returns the manifest rows.
+    """
+    # Every preset is recorded, so resuming with a different selection of difficulties still matches
+    presets = {difficulty: dict(settings.preset(difficulty)) for difficulty in DIFFICULTIES}
+    silence_duration = settings.get("space_duration")
+    rows = plan_exercises(modes, key_names, difficulties, count, seed, presets)
+    os.makedirs(output, exist_ok=True)
+
+    descriptor = pack_descriptor(seed, count, quality, presets, silence_duration)
+    previous = read_pack_descriptor(output)
+    if previous is None and os.path.exists(os.path.join(output, "manifest.json")):
+        previous = {}  # Exported before descriptors were written; its parameters are unknown
+    if previous is not None and previous != descriptor:
+        if not rerender:
+            raise ValueError("%s holds a pack exported with different parameters; "
+                             "choose another directory or pass --rerender" % output)
+        remove_rendered(output, rows)
+    # Written before rendering, so the descriptor always describes the files on disk
+    with atomic_write(os.path.join(output, PACK_DESCRIPTOR), 'w') as file:
+        json.dump(descriptor, file, indent=1)
+
+    # Build the shared sample banks once, before the workers map them
+    game = EarTrainingGame(autoplay=False, record_stats=False, prefetch_depth=0, quality=quality)
+    game.chord_bank.open()
+    game.note_bank.open()
+
+    tasks = [(output, silence_duration, rows[start:start + EXERCISES_PER_TASK])
+             for start in range(0, len(rows), EXERCISES_PER_TASK)]
+    done = rendered = 0
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(quality,)) as pool:
+        for task_done, task_rendered in pool.imap_unordered(_render_task, tasks):
+            done += task_done
+            rendered += task_rendered
+            print(f"{done}/{len(rows)} exercises ({rendered} rendered)", flush=True)
+
+    write_manifest(output, rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a pack of ear training exercises with answer manifests")
+    parser.add_argument("output", help="directory for the WAVs and manifests")
+    parser.add_argument("--count", type=int, default=100, help="exercises per mode, key and difficulty")
+    parser.add_argument("--modes", nargs="+", default=[mode for mode in EarTrainingGame.modes if mode != "Custom"],
+                        choices=[mode for mode in EarTrainingGame.modes if mode != "Custom"], metavar="MODE")
+    parser.add_argument("--keys", nargs="+", default=["C"], choices=list(EarTrainingGame.key_to_adjustment),
+                        metavar="KEY")
+    parser.add_argument("--difficulties", nargs="+", default=DIFFICULTIES, choices=DIFFICULTIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--quality", choices=sorted(QUALITY_TIERS), default="high")
+    parser.add_argument("--rerender", action="store_true",
+                        help="render every file again if output holds a pack exported with other parameters")
+    args = parser.parse_args()
+    try:
+        export_pack(args.output, args.modes, args.keys, args.difficulties, args.count, args.seed, args.workers,
+                    args.quality, args.rerender)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from atomicfile import atomic_path, atomic_write
+
+
+class MemoryBank(ABC):
+    """Waveforms rendered once into a float32 .npy file and memory-mapped.
+
+    The index file next to the bank records the parameters it was built
+    with and where each waveform lives; a bank whose index does not match
+    parameters(), or whose file is missing or not laid out as layout()
+    says, is rebuilt on open. Banks are opened with
+    np.load(mmap_mode='r'), so lookups are zero-copy read-only views whose
+    pages are shared by every process using the same bank.
+
+    Subclasses set file_prefix and implement parameters(), layout(),
+    render() and lookup_table().
+    """
+
+    file_prefix = None  # Bank files are <file_prefix>_<sample rate>.npy and .json
+
+    def __init__(self, sample_rate, directory):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.entries = None  # Lookup table built by lookup_table()
+        self.bank = None
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def parameters(self):
+        """Everything that determines the bank's contents."""
+
+    @abstractmethod
+    def layout(self):
+        """Return (shape, entries): the bank's array shape and its JSON-serializable index entries."""
+
+    @abstractmethod
+    def render(self, bank, entries):
+        """Fill the writable bank array laid out by layout()."""
+
+    @abstractmethod
+    def lookup_table(self, entries):
+        """Turn the index entries into the table lookups are served from."""
+
+    def path(self):
+        return os.path.join(self.directory, "%s_%d.npy" % (self.file_prefix, self.sample_rate))
+
+    def index_path(self):
+        return os.path.join(self.directory, "%s_%d.json" % (self.file_prefix, self.sample_rate))
+
+    def open(self):
+        """Map the bank into memory, building it first if it is missing, stale or damaged."""
+        if self.bank is not None:
+            return self.bank
+        with self.lock:
+            if self.bank is None:
+                parameters = self.parameters()
+                try:
+                    with open(self.index_path()) as file:
+                        index = json.load(file)
+                    current = index["parameters"] == parameters
+                except (FileNotFoundError, ValueError, KeyError, TypeError):
+                    current = False
+                bank = self.load() if current else None
+                if bank is None:
+                    index = self.build(parameters)
+                    bank = np.load(self.path(), mmap_mode='r')
+                self.entries = self.lookup_table(index["entries"])
+                self.bank = bank
+        return self.bank
+
+    def load(self):
+        """Map the bank file, or return None if it is missing, unreadable or not the shape layout() expects."""
+        try:
+            bank = np.load(self.path(), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if bank.dtype != np.float32 or bank.shape != tuple(self.layout()[0]):
+            return None
+        return bank
+
+    def build(self, parameters):
+        """Render the bank and write its index; both are replaced atomically."""
+        os.makedirs(self.directory, exist_ok=True)
+        shape, entries = self.layout()
+        with atomic_path(self.path(), suffix=".npy") as temporary_path:
+            bank = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=np.float32, shape=shape)
+            self.render(bank, entries)
+            bank.flush()
+            del bank
+        # The index goes last, so a bank without a matching index is never trusted
+        index = {"parameters": parameters, "entries": entries}
+        with atomic_write(self.index_path(), 'w', suffix=".json") as file:
+            json.dump(index, file)
+        return index
+
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+
+def shared_bank(bank_class, *arguments):
+    """Return the process-wide bank_class instance built from these hashable arguments."""
+    key = (bank_class,) + arguments
+    with _banks_lock:
+        if key not in _banks:
+            _banks[key] = bank_class(*arguments)
+        return _banks[key]
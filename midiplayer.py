@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from array import array
+
+
+NOTE_VELOCITY = 64
+SPIN_THRESHOLD = 0.002  # Seconds before an event at which the scheduler stops sleeping and polls the clock
+
+
+def _mido():
+    """Import mido on first use; only MIDI playback needs it."""
+    import mido
+    return mido
+
+
+def round_events(dominant, tonic, notes, note_duration, interlude_duration=1.0, velocity=NOTE_VELOCITY):
+    """Lay out a cadence followed by test notes as a timestamped event list.
+
+    The dominant and tonic chords each sound for note_duration seconds with a
+    gap of note_duration between them; the test notes follow one after
+    another after interlude_duration. Returns (seconds, type, note, velocity)
+    tuples sorted by time, note_off before note_on at equal times.
+    """
+    events = []
+
+    def add(start, chord):
+        for note in chord:
+            events.append((start, 'note_on', int(note), velocity))
+            events.append((start + note_duration, 'note_off', int(note), 0))
+
+    add(0.0, dominant)
+    add(2 * note_duration, tonic)
+    notes_start = 3 * note_duration + interlude_duration
+    for index, note in enumerate(notes):
+        add(notes_start + index * note_duration, (note,))
+    events.sort(key=lambda event: (event[0], event[1] == 'note_on'))
+    return events
+
+
+# Sends timestamped MIDI events from a scheduler thread against the monotonic clock
+class MidiPlayer:
+
+    def __init__(self, port=None, port_name=None):
+        self.port = port  # Anything with send(message): a mido output, virtual or in-memory port
+        self.port_name = port_name  # Output opened on first use when no port is given; None for the default
+        self.owns_port = port is None
+        self.on_jitter = None  # Optional callback receiving jitter_report() after each schedule
+        self.jitter = array('d')  # Seconds each event of the last schedule was sent after its timestamp
+        self.cancel = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        """Open the output port on first use."""
+        with self.lock:
+            if self.port is None:
+                self.port = _mido().open_output(self.port_name)
+            return self.port
+
+    def close(self):
+        self.stop()
+        with self.lock:
+            if self.owns_port and self.port is not None:
+                self.port.close()
+                self.port = None
+
+    def play(self, events):
+        """Stop whatever is playing and schedule events, timed from now."""
+        self.stop()
+        port = self.open()
+        mido = _mido()
+        # Messages are built up front so the scheduler thread only waits and sends
+        messages = [(at, mido.Message(kind, note=note, velocity=velocity)) for at, kind, note, velocity in events]
+        self.cancel = threading.Event()
+        self.thread = threading.Thread(target=self._dispatch, args=(port, messages, self.cancel), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Cancel the current schedule; notes still sounding are switched off."""
+        self.cancel.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def wait(self):
+        """Block until the current schedule has been sent."""
+        if self.thread is not None:
+            self.thread.join()
+
+    def _dispatch(self, port, messages, cancel):
+        jitter = array('d')
+        sounding = {}
+        start = time.monotonic()
+        for at, message in messages:
+            due = start + at
+            remaining = due - time.monotonic()
+            # Sleep until just before the event, then poll so it leaves on time
+            if remaining > SPIN_THRESHOLD and cancel.wait(remaining - SPIN_THRESHOLD):
+                break
+            while time.monotonic() < due and not cancel.is_set():
+                pass
+            if cancel.is_set():
+                break
+            port.send(message)
+            jitter.append(time.monotonic() - due)
+            if message.type == 'note_on':
+                sounding[message.note] = message
+            else:
+                sounding.pop(message.note, None)
+        for message in sounding.values():
+            port.send(_mido().Message('note_off', note=message.note, channel=message.channel))
+        self.jitter = jitter
+        if self.on_jitter is not None:
+            self.on_jitter(self.jitter_report())
+
+    def jitter_report(self):
+        """Lateness of the last schedule's events in milliseconds."""
+        jitter = self.jitter
+        if not jitter:
+            return None
+        ordered = sorted(jitter)
+        return {
+            "events": len(ordered),
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p99_ms": ordered[min(int(0.99 * len(ordered)), len(ordered) - 1)] * 1000,
+            "max_ms": ordered[-1] * 1000
+        }
+
+
+def midi_player_from_environment(variable="EARTRAINING_MIDI_PORT"):
+    """A MidiPlayer for the port named by the environment variable, or None for WAV playback.
+
+    The value "default" selects mido's default output.
+    """
+    port_name = os.environ.get(variable)
+    if not port_name:
+        return None
+    return MidiPlayer(port_name=None if port_name == "default" else port_name)
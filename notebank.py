@@ -0,0 +1,63 @@
+import numpy as np
+
+from memorybank import MemoryBank, shared_bank
+from soundmodule import render_note, midi_to_frequency, SYNTHESIS_VERSION, WAVETABLE_BITS
+
+
+# Where banks are written, one .npy file and index per sample rate
+NOTE_BANK_DIRECTORY = "note_bank"
+
+
+class NoteBank(MemoryBank):
+    """One rendered waveform per MIDI note and standard duration, memory-mapped.
+
+    All notes are stored back to back in a single flat bank; the index maps
+    (note, duration) to an offset and length.
+    """
+
+    file_prefix = "notes"
+
+    def __init__(self, notes, durations, sample_rate=44100, directory=NOTE_BANK_DIRECTORY):
+        super().__init__(sample_rate, directory)
+        self.notes = sorted(set(int(note) for note in notes))
+        self.durations = sorted(set(float(duration) for duration in durations))
+
+    def parameters(self):
+        return {
+            "synthesis_version": SYNTHESIS_VERSION,
+            "wavetable_bits": WAVETABLE_BITS,
+            "sample_rate": self.sample_rate,
+            "notes": self.notes,
+            "durations": self.durations
+        }
+
+    def layout(self):
+        entries = []
+        offset = 0
+        for note in self.notes:
+            for duration in self.durations:
+                length = int(np.ceil(duration * self.sample_rate))  # Same length render_note produces
+                entries.append([note, duration, offset, length])
+                offset += length
+        return (offset,), entries
+
+    def render(self, bank, entries):
+        for note, duration, start, length in entries:
+            bank[start:start + length] = render_note(midi_to_frequency(note), duration, self.sample_rate)
+
+    def lookup_table(self, entries):
+        return {(note, duration): (offset, length) for note, duration, offset, length in entries}
+
+    def note(self, midi_note, duration):
+        """Read-only waveform of a note, or None if the bank does not hold it."""
+        bank = self.open()
+        entry = self.entries.get((int(midi_note), float(duration)))
+        if entry is None:
+            return None
+        offset, length = entry
+        return bank[offset:offset + length]
+
+
+def get_note_bank(notes, durations, sample_rate=44100, directory=NOTE_BANK_DIRECTORY):
+    """Return the process-wide bank for these notes, durations, sample rate and directory."""
+    return shared_bank(NoteBank, tuple(sorted(set(notes))), tuple(sorted(set(durations))), sample_rate, directory)
@@ -0,0 +1,128 @@
+import numpy as np
+from functools import lru_cache
+
+
+# Probability of staying in the first octave after a note in the first octave
+FIRST_OCTAVE_STAY_PROBABILITY = 0.75
+
+# Weight added to every degree's error rate so mastered notes still come up
+MIN_NOTE_WEIGHT = 0.1
+
+
+@lru_cache(maxsize=None)
+def note_transition_table(mode_size):
+    """Cumulative no-repeat transition table over indices into a mode.
+
+    Row i holds the cumulative distribution of the next index given that the
+    previous note was index i: uniform over every other note in the mode.
+    """
+    if mode_size == 1:
+        probabilities = np.ones((1, 1))
+    else:
+        probabilities = np.full((mode_size, mode_size), 1.0 / (mode_size - 1))
+        np.fill_diagonal(probabilities, 0.0)
+    return _cumulative(probabilities)
+
+
+@lru_cache(maxsize=None)
+def octave_transition_table(octave_range):
+    """Cumulative transition table over octave offsets 0..octave_range-1.
+
+    After the first octave the next note stays there 75% of the time and
+    otherwise jumps to another octave; from any other octave the next note
+    moves to a different octave uniformly.
+    """
+    if octave_range == 1:
+        return _cumulative(np.ones((1, 1)))
+    probabilities = np.full((octave_range, octave_range), 1.0 / (octave_range - 1))
+    np.fill_diagonal(probabilities, 0.0)
+    probabilities[0, 0] = FIRST_OCTAVE_STAY_PROBABILITY
+    probabilities[0, 1:] = (1 - FIRST_OCTAVE_STAY_PROBABILITY) / (octave_range - 1)
+    return _cumulative(probabilities)
+
+
+def weakness_weights(confusion, degrees, prior=1.0):
+    """Selection weight per degree from a 12x12 target-vs-guess confusion matrix.
+
+    The weight is the smoothed error rate of each degree (rows are targets,
+    the diagonal counts correct answers) plus MIN_NOTE_WEIGHT. Unseen degrees
+    get an error rate of one half.
+    """
+    degrees = np.asarray(degrees, dtype=np.int64)
+    attempts = confusion.sum(axis=1)[degrees]
+    errors = attempts - confusion.diagonal()[degrees]
+    return (errors + prior) / (attempts + 2 * prior) + MIN_NOTE_WEIGHT
+
+
+def weighted_note_tables(weights):
+    """Cumulative tables for drawing mode indices in proportion to weights.
+
+    Returns (start, transitions): the distribution of the first note, and a
+    no-repeat transition table whose row i excludes index i and renormalizes
+    the remaining weights.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    start = np.cumsum(weights / weights.sum())
+    start[-1] = 1.0
+    start.setflags(write=False)
+    if len(weights) == 1:
+        return start, _cumulative(np.ones((1, 1)))
+    probabilities = np.tile(weights, (len(weights), 1))
+    np.fill_diagonal(probabilities, 0.0)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    return start, _cumulative(probabilities)
+
+
+def _cumulative(probabilities):
+    table = np.cumsum(probabilities, axis=1)
+    table[:, -1] = 1.0  # Guard against rounding leaving the last bin short
+    table.setflags(write=False)  # Tables are cached and shared between callers
+    return table
+
+
+def sample_chains(rng, transition_table, count, length, start_table=None):
+    """Sample count Markov chains of the given length as an index array.
+
+    The first state is uniform, or drawn from the cumulative start_table if
+    given; every following column is drawn for all chains at once from the
+    rows of the cumulative transition table.
+    """
+    states = transition_table.shape[0]
+    chains = np.empty((count, length), dtype=np.int64)
+    if length == 0:
+        return chains
+    if start_table is None:
+        chains[:, 0] = rng.integers(0, states, size=count)
+    else:
+        chains[:, 0] = np.minimum(np.searchsorted(start_table, rng.random(count), side='right'), states - 1)
+    draws = rng.random((count, length - 1))
+    for position in range(1, length):
+        rows = transition_table[chains[:, position - 1]]
+        chains[:, position] = np.minimum((draws[:, position - 1, np.newaxis] >= rows).sum(axis=1), states - 1)
+    return chains
+
+
+def generate_test_sequences(mode, number_of_notes, octave_range, key, count, seed=None, note_tables=None):
+    """Generate count test sequences in one call.
+
+    Returns (pre_octave, adjusted) integer arrays of shape (count,
+    number_of_notes): the MIDI notes picked from the mode, and the same notes
+    after octave and key adjustment. seed may be an int or a
+    numpy.random.Generator. note_tables, as returned by weighted_note_tables,
+    replaces the uniform choice of notes.
+    """
+    rng = np.random.default_rng(seed)
+    mode_notes = np.asarray(mode, dtype=np.int64)
+    number_of_notes = int(number_of_notes)
+    octave_range = max(int(octave_range), 1)
+
+    if note_tables is None:
+        note_indices = sample_chains(rng, note_transition_table(len(mode_notes)), count, number_of_notes)
+    else:
+        start, transitions = note_tables
+        note_indices = sample_chains(rng, transitions, count, number_of_notes, start)
+    octave_offsets = sample_chains(rng, octave_transition_table(octave_range), count, number_of_notes)
+
+    pre_octave = mode_notes[note_indices]
+    adjusted = pre_octave + octave_offsets * 12 + key
+    return pre_octave, adjusted
@@ -0,0 +1,191 @@
+import atexit
+import configparser
+import os
+import threading
+from types import MappingProxyType
+
+from atomicfile import atomic_write
+
+
+CONFIG_FILE = 'settings.txt'
+SAVE_DELAY = 0.5  # Seconds of quiet before pending changes are written
+
+# Durations in seconds, stored under the DEFAULT section with their historical names
+DEFAULT_DURATIONS = {
+    "intro_duration": 0.2,
+    "test_duration": 1.0,
+    "space_duration": 1.0
+}
+DURATION_KEYS = {
+    "intro_duration": "intro_speed",
+    "test_duration": "test_speed",
+    "space_duration": "space_between"
+}
+
+# Difficulty presets for various levels, one section each
+DEFAULT_PRESETS = {
+    "Easy": {"number_of_notes": 2.0, "octave_range": 1.0, "duration": 2.0},
+    "Medium": {"number_of_notes": 3.0, "octave_range": 1.0, "duration": 1.5},
+    "Hard": {"number_of_notes": 5.0, "octave_range": 2.0, "duration": 1.0},
+    "Impossible": {"number_of_notes": 16.0, "octave_range": 3.0, "duration": 0.5},
+    "Custom": {"number_of_notes": 7.0, "octave_range": 1.0, "duration": 0.5}
+}
+MINIMUM_VALUES = {"number_of_notes": 1.0, "octave_range": 1.0}  # Anything else just has to be positive
+
+
+def validate(name, value):
+    """Return value as a float, raising ValueError if it is out of range."""
+    value = float(value)
+    minimum = MINIMUM_VALUES.get(name)
+    if not (value > 0.0 if minimum is None else value >= minimum):
+        raise ValueError("invalid value for %s: %r" % (name, value))
+    return value
+
+
+class SettingsStore:
+    """Validated settings held in memory and backed by an INI file.
+
+    Reads never touch the disk after the first load. refresh() re-reads
+    the file only when its modification time changed. Changes are applied
+    in memory at once, reported to listeners, and written after SAVE_DELAY
+    seconds without further changes, through a temporary file renamed into
+    place.
+    """
+
+    def __init__(self, path=CONFIG_FILE, save_delay=SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.durations = MappingProxyType(dict(DEFAULT_DURATIONS))
+        self.presets = MappingProxyType({name: MappingProxyType(dict(values))
+                                         for name, values in DEFAULT_PRESETS.items()})
+        self.loaded = False
+        self.mtime = None  # st_mtime_ns of the file as last read or written
+        self.listeners = []
+        self.save_timer = None
+        self.lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def get(self, name):
+        """One of the durations in DEFAULT_DURATIONS."""
+        if not self.loaded:
+            self.refresh()
+        return self.durations[name]
+
+    def preset(self, name):
+        """Read-only difficulty preset by name."""
+        if not self.loaded:
+            self.refresh()
+        return self.presets[name]
+
+    def refresh(self):
+        """Reload the file if it changed since it was last read or written; return whether it did."""
+        with self.lock:
+            self.loaded = True
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self.mtime:
+                return False
+            self._read()
+            self.mtime = mtime
+        self._notify()
+        return True
+
+    def _read(self):
+        config = configparser.ConfigParser()
+        try:
+            config.read(self.path)
+        except configparser.Error as e:
+            print("Error loading settings:", e)
+            return
+        # Missing or invalid entries keep their current value
+        durations = dict(self.durations)
+        for name, key in DURATION_KEYS.items():
+            if key in config.defaults():
+                try:
+                    durations[name] = validate(name, config.defaults()[key])
+                except ValueError as e:
+                    print("Ignoring setting:", e)
+        presets = {name: dict(values) for name, values in self.presets.items()}
+        for name, values in presets.items():
+            if not config.has_section(name):
+                continue
+            for key in values:
+                if config.has_option(name, key):
+                    try:
+                        values[key] = validate(key, config.get(name, key))
+                    except ValueError as e:
+                        print("Ignoring setting:", e)
+        self.durations = MappingProxyType(durations)
+        self.presets = MappingProxyType({name: MappingProxyType(values) for name, values in presets.items()})
+
+    def update(self, **durations):
+        """Change durations, e.g. update(test_duration=0.8); raises ValueError on bad values."""
+        changed = {name: validate(name, value) for name, value in durations.items() if name in DEFAULT_DURATIONS}
+        if len(changed) != len(durations):
+            raise ValueError("unknown setting: %s" % ", ".join(sorted(set(durations) - set(changed))))
+        with self.lock:
+            if not self.loaded:
+                self.refresh()
+            self.durations = MappingProxyType(dict(self.durations, **changed))
+            self._schedule_save()
+        self._notify()
+
+    def update_preset(self, name, **values):
+        """Change fields of a difficulty preset; raises ValueError on bad names or values."""
+        if name not in DEFAULT_PRESETS:
+            raise ValueError("unknown preset: %s" % name)
+        changed = {key: validate(key, value) for key, value in values.items() if key in DEFAULT_PRESETS[name]}
+        if len(changed) != len(values):
+            raise ValueError("unknown preset field: %s" % ", ".join(sorted(set(values) - set(changed))))
+        with self.lock:
+            if not self.loaded:
+                self.refresh()
+            presets = dict(self.presets)
+            presets[name] = MappingProxyType(dict(presets[name], **changed))
+            self.presets = MappingProxyType(presets)
+            self._schedule_save()
+        self._notify()
+
+    def add_listener(self, callback):
+        """Call callback(store) whenever settings change, from a save or a reload."""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self.listeners.remove(callback)
+
+    def _notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+
+    def _schedule_save(self):
+        # Debounced: every change restarts the countdown
+        if self.save_timer is not None:
+            self.save_timer.cancel()
+        self.save_timer = threading.Timer(self.save_delay, self.flush)
+        self.save_timer.daemon = True
+        self.save_timer.start()
+
+    def flush(self):
+        """Write pending changes now."""
+        with self.lock:
+            if self.save_timer is None:
+                return
+            self.save_timer.cancel()
+            self.save_timer = None
+
+            config = configparser.ConfigParser()
+            config['DEFAULT'] = {key: str(self.durations[name]) for name, key in DURATION_KEYS.items()}
+            for name, values in self.presets.items():
+                config[name] = {key: str(value) for key, value in values.items()}
+
+            with atomic_write(self.path, 'w') as file:
+                config.write(file)
+            self.mtime = os.stat(self.path).st_mtime_ns  # Our own write is not a change to reload
+
+
+settings = SettingsStore()
@@ -1,155 +1,495 @@
 import numpy as np
-from scipy.io.wavfile import write
 import random
 import os
-import configparser  # Add this import
+import struct
+import threading
+from collections import OrderedDict
+
+from settingsstore import settings
 
 
-CONFIG_FILE = 'settings.txt'  # Add this line
-# Default settings
-intro_duration = 0.2  # seconds
-test_duration = 1.0   # seconds
-space_duration = 1.0  # seconds
 major = True
 
 
 def get_current_settings():
-    return intro_duration, test_duration, space_duration
+    """Intro, test and space durations in seconds, read from memory."""
+    return settings.get("intro_duration"), settings.get("test_duration"), settings.get("space_duration")
 def midi_to_frequency(midi_note):
     return 2 ** ((midi_note - 69) / 12) * 440   
     # A4 MIDI note is 69 and should return a frequency of 440 Hz
     print(midi_to_frequency(69))  # Expected output: 440
 
 
-def create_note(frequency, duration, sample_rate=44100, fade_in_duration=0.01, fade_out_duration=0.1):
-    samples = np.arange(duration * sample_rate)
-    waveform = 2 * np.abs(2 * (samples * frequency / sample_rate - np.floor(samples * frequency / sample_rate + 0.5)))
+# Bump whenever a change to synthesis alters rendered output, so caches rebuild
+SYNTHESIS_VERSION = 3
+
+# Output sample rate of each audio quality tier; lower tiers render and send less data
+QUALITY_TIERS = {
+    "low": 16000,
+    "medium": 22050,
+    "high": 44100
+}
+
+# Samples per single-cycle wavetable (a power of two so the phase splits cleanly)
+WAVETABLE_BITS = 11
+WAVETABLE_SIZE = 1 << WAVETABLE_BITS
+PHASE_BITS = 32  # Width of the fixed-point phase accumulator
+FRACTION_BITS = PHASE_BITS - WAVETABLE_BITS
+
+
+def triangle_cycle(phase):
+    return 2 * np.abs(2 * (phase - np.floor(phase + 0.5)))
+
+
+def sine_cycle(phase):
+    return np.sin(2 * np.pi * phase)
+
+
+def square_cycle(phase):
+    return np.where(phase < 0.5, 1.0, -1.0)
+
+
+class Wavetable:
+    """Single-cycle waveform read through a fixed-point phase accumulator.
+
+    The phase advances by a 32-bit increment per sample and wraps for free
+    on overflow. Its top bits index the table and the remaining bits
+    linearly interpolate to the next entry. Rendering walks the output in
+    fixed-size blocks with in-place float32 ufuncs, so scratch memory does
+    not grow with the note length.
+    """
+
+    block_size = 4096  # Samples rendered per pass through the scratch buffers
+
+    def __init__(self, cycle_function, size_bits=WAVETABLE_BITS):
+        self.size_bits = size_bits
+        self.fraction_bits = PHASE_BITS - size_bits
+        phase = np.arange(2 ** size_bits + 1) / 2 ** size_bits  # One guard point for interpolation
+        table = cycle_function(phase).astype(np.float32)
+        self.table = table[:-1]
+        self.slopes = np.diff(table).astype(np.float32)
+        self.table.setflags(write=False)
+        self.slopes.setflags(write=False)
+
+    def render(self, frequency, num_samples, sample_rate=44100, out=None):
+        """Render num_samples of the waveform at frequency into out (float32)."""
+        if out is None:
+            out = np.empty(num_samples, dtype=np.float32)
+        increment = np.uint32(int(round(frequency / sample_rate * 2 ** PHASE_BITS)) % 2 ** PHASE_BITS)
+        fraction_mask = np.uint32((1 << self.fraction_bits) - 1)
+        fraction_scale = np.float32(1.0 / (1 << self.fraction_bits))
+
+        block = min(self.block_size, num_samples)
+        ramp = np.arange(block, dtype=np.uint32)
+        phase = np.empty(block, dtype=np.uint32)
+        fraction = phase.view(np.float32)  # Reuses the phase buffer once the index is taken
+        index = np.empty(block, dtype=np.intp)
+
+        for start in range(0, num_samples, block):
+            stop = min(start + block, num_samples)
+            count = stop - start
+            p, f, i, o = phase[:count], fraction[:count], index[:count], out[start:stop]
+
+            np.multiply(np.add(ramp[:count], np.uint32(start), out=p), increment, out=p)  # Wraps modulo 2**32
+            np.right_shift(p, self.fraction_bits, out=i)
+            np.bitwise_and(p, fraction_mask, out=p)
+            np.multiply(p, fraction_scale, out=f, casting='unsafe')
+
+            np.take(self.slopes, i, out=o)
+            np.multiply(o, f, out=o)
+            np.add(o, self.table[i], out=o)
+        return out
+
+    def render_voices(self, frequencies, num_samples, sample_rate=44100, gains=None):
+        """Render one row per frequency in a single broadcasted pass.
+
+        Returns a float32 array of shape (voices, num_samples); each row is
+        scaled by its entry in gains when given. The phase arithmetic is the
+        same as render, so a voice matches the corresponding single note.
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        voices = len(frequencies)
+        out = np.empty((voices, num_samples), dtype=np.float32)
+        increments = (np.round(frequencies / sample_rate * 2 ** PHASE_BITS).astype(np.int64) % 2 ** PHASE_BITS)
+        increments = increments.astype(np.uint32)[:, np.newaxis]
+        fraction_mask = np.uint32((1 << self.fraction_bits) - 1)
+        fraction_scale = np.float32(1.0 / (1 << self.fraction_bits))
+
+        block = min(self.block_size, num_samples)
+        ramp = np.arange(block, dtype=np.uint32)
+        phase = np.empty((voices, block), dtype=np.uint32)
+        fraction = phase.view(np.float32)
+        index = np.empty((voices, block), dtype=np.intp)
+
+        for start in range(0, num_samples, block):
+            stop = min(start + block, num_samples)
+            count = stop - start
+            p, f, i, o = phase[:, :count], fraction[:, :count], index[:, :count], out[:, start:stop]
+
+            np.multiply(np.add(ramp[:count], np.uint32(start)), increments, out=p)  # Voices x samples, wraps
+            np.right_shift(p, self.fraction_bits, out=i)
+            np.bitwise_and(p, fraction_mask, out=p)
+            np.multiply(p, fraction_scale, out=f, casting='unsafe')
+
+            np.take(self.slopes, i, out=o)
+            np.multiply(o, f, out=o)
+            np.add(o, self.table[i], out=o)
+
+        if gains is not None:
+            np.multiply(out, np.asarray(gains, dtype=np.float32)[:, np.newaxis], out=out)
+        return out
+
+
+# Voices available to create_note and generate_chord
+wavetables = {
+    "triangle": Wavetable(triangle_cycle),
+    "sine": Wavetable(sine_cycle),
+    "square": Wavetable(square_cycle)
+}
+
+
+def register_wavetable(name, cycle_function):
+    """Make a new voice available by name; cycle_function maps phase in [0, 1) to amplitude."""
+    wavetables[name] = Wavetable(cycle_function)
+    note_cache.clear()  # A replaced voice would otherwise keep serving stale waveforms
+
+
+# Memory budget for cached note waveforms, in bytes
+NOTE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class NoteCache:
+    """Bounded LRU cache of rendered note waveforms."""
+
+    def __init__(self, max_bytes=NOTE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached waveform for key, or None on a miss."""
+        with self._lock:
+            waveform = self._entries.get(key)
+            if waveform is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return waveform
+
+    def put(self, key, waveform):
+        """Store a waveform as read-only and evict least recently used entries."""
+        waveform.setflags(write=False)
+        if waveform.nbytes > self.max_bytes:
+            return waveform
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = waveform
+            self.current_bytes += waveform.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+        return waveform
+
+    def set_max_bytes(self, max_bytes):
+        """Change the memory budget, evicting entries if it shrank."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._entries and self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and memory usage as a dictionary."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+note_cache = NoteCache()
+
+
+def synthesize_note(frequency, duration, sample_rate=44100, fade_in_duration=0.01, fade_out_duration=0.1, waveform="triangle"):
+    """Return a read-only float32 note, rendering it only on a cache miss."""
+    key = (frequency, duration, sample_rate, fade_in_duration, fade_out_duration, waveform)
+    note = note_cache.get(key)
+    if note is None:
+        note = note_cache.put(key, render_note(frequency, duration, sample_rate, fade_in_duration, fade_out_duration, waveform))
+    return note
+
+
+def create_note(frequency, duration, sample_rate=44100, fade_in_duration=0.01, fade_out_duration=0.1, waveform="triangle"):
+    """Return a note quantized to int16 at full scale."""
+    return quantize(synthesize_note(frequency, duration, sample_rate, fade_in_duration, fade_out_duration, waveform))
+
+
+def render_note(frequency, duration, sample_rate=44100, fade_in_duration=0.01, fade_out_duration=0.1, waveform="triangle"):
+    """Render a faded float32 note whose peak is 1.0."""
+    num_samples = int(np.ceil(duration * sample_rate))
+    note = wavetables[waveform].render(frequency, num_samples, sample_rate)
 
     # Calculate the number of samples for fade in and fade out
     fade_in_samples = int(fade_in_duration * sample_rate)
     fade_out_samples = int(fade_out_duration * sample_rate)
 
     # Ensure waveform is long enough for fade in and fade out
-    if len(waveform) > fade_in_samples + fade_out_samples:
-        fade_in = np.linspace(0, 1, fade_in_samples)
-        waveform[:fade_in_samples] *= fade_in
-
-        fade_out = np.linspace(1, 0, fade_out_samples)
-        waveform[-fade_out_samples:] *= fade_out
-    else:
-        # For very short waveforms, adjust or skip fading
-        # This example simply normalizes the waveform without fading
-        waveform = waveform * (32767 / np.max(np.abs(waveform)))
-
-    max_val = np.max(np.abs(waveform))
-    if max_val > 0:
-        waveform = waveform * (32767 / max_val)
-    waveform = np.nan_to_num(waveform).astype(np.int16)
-
-    return waveform
+    if len(note) > fade_in_samples + fade_out_samples:
+        note[:fade_in_samples] *= np.linspace(0, 1, fade_in_samples, dtype=np.float32)
+        note[len(note) - fade_out_samples:] *= np.linspace(1, 0, fade_out_samples, dtype=np.float32)
+    # Very short notes are simply normalized without fading
+
+    return normalize_region(note)
+
+
+def quantize(waveform, peak=None, dither=False, rng=None):
+    """Convert a float32 buffer with full scale at 1.0 to int16 in one step.
+
+    Anything louder than full scale is scaled down to fit rather than
+    clipped; pass peak when it is already known (e.g. for streamed chunks)
+    so every chunk uses the same scale. With dither, triangular noise of one
+    LSB is added before rounding.
+    """
+    if peak is None:
+        peak = np.max(np.abs(waveform), initial=0)
+    scaled = np.multiply(waveform, np.float32(32767 / max(float(peak), 1.0)), dtype=np.float32)
+    if dither:
+        rng = np.random.default_rng() if rng is None else rng
+        scaled += rng.random(len(scaled), dtype=np.float32)
+        scaled -= rng.random(len(scaled), dtype=np.float32)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
 
 def set_durations(intro_dur, test_dur, space_dur):
     return intro_dur, test_dur, space_dur
 
 
 def load_settings():
-    config = configparser.ConfigParser()
-    try:
-        config.read(CONFIG_FILE)
-
-        try:
-            intro_speed = float(config['DEFAULT']['intro_speed'])
-            test_speed = float(config['DEFAULT']['test_speed'])
-            space_between = float(config['DEFAULT']['space_between'])
-        except ValueError:
-            print("Invalid settings detected. Resetting to default values.")
-            intro_speed = 0.2
-            test_speed = 1.0
-            space_between = 1.0
-            save_settings(intro_speed, test_speed, space_between)
-
-        print("Settings loaded:", intro_speed, test_speed, space_between) 
-        return intro_speed, test_speed, space_between
-
-    except (KeyError, FileNotFoundError) as e:  
-        print("Error loading settings:", e)
-        intro_speed = 0.2
-        test_speed = 1.0
-        space_between = 1.0
-        save_settings(intro_speed, test_speed, space_between)
-
-    return intro_speed, test_speed, space_between
+    """Pick up edits to the settings file, if any, and return the durations."""
+    settings.refresh()
+    return get_current_settings()
 
-def save_settings(intro_speed, test_speed, space_between):
-    config = configparser.ConfigParser()
-    config['DEFAULT'] = {
-        'intro_speed': str(intro_speed),
-        'test_speed': str(test_speed),
-        'space_between': str(space_between)
-    }
-    print("Saving settings...")
 
-    with open(CONFIG_FILE, 'w') as file:
-        config.write(file)
+def save_settings(intro_speed, test_speed, space_between):
+    """Store new durations; the file is written shortly after, atomically."""
+    settings.update(intro_duration=intro_speed, test_duration=test_speed, space_duration=space_between)
 
 
 def apply_settings(intro_speed_entry, test_speed_entry, space_between_entry):
-    # Get values from the Entry widgets and convert them to floats
-    intro_speed = float(intro_speed_entry.get())
-    test_speed = float(test_speed_entry.get())
-    space_between = float(space_between_entry.get())
-
-    print("Applying settings:", intro_speed, test_speed, space_between)
-
-    # Update the global settings variables directly
-    global intro_duration, test_duration, space_duration
-    intro_duration = intro_speed if intro_speed else 0.2
-    test_duration = test_speed if test_speed else 1.0
-    space_duration = space_between if space_between else 1.0
-
-    # Save settings after making changes
-    save_settings(intro_duration, test_duration, space_duration)  # Pass the float values
-
-    # Now load the new settings
-    intro_speed, test_speed, space_between = load_settings() 
-
-    print("Settings loaded:", intro_speed, test_speed, space_between)
-
-    # Update the global settings variables directly
-    intro_duration = float(intro_speed) if intro_speed else 0.2
-    test_duration = float(test_speed) if test_speed else 1.0
-    space_duration = float(space_between) if space_between else 1.0
-
-    # Save settings after making changes
-    save_settings() 
-
-import numpy as np
-
-def generate_chord(key, target_duration, mode, sample_rate=44100):
-    # Calculate frequencies for root, third, and fifth
-    root_freq = midi_to_frequency(mode[0])
-    third_freq = midi_to_frequency(mode[2])  # Major third
-    fifth_freq = midi_to_frequency(mode[4])  # Perfect fifth
-    
-    # Time array
-    t = np.linspace(0, target_duration, int(sample_rate * target_duration), endpoint=False)
-    
-    # Generate triangle waves for each note
-    root_wave = 2 * np.abs(2 * (t * root_freq - np.floor(t * root_freq + 0.5)))
-    third_wave = 2 * np.abs(2 * (t * third_freq - np.floor(t * third_freq + 0.5)))
-    fifth_wave = 2 * np.abs(2 * (t * fifth_freq - np.floor(t * fifth_freq + 0.5)))
-    
-    # Combine the waves
-    chord_wave = root_wave + third_wave + fifth_wave
-    
-    # Normalize volume
-    chord_wave = chord_wave * (32767 / np.max(np.abs(chord_wave)))
-    
-    # Convert to int16 format
-    chord_wave = chord_wave.astype(np.int16)
-    
-    return chord_wave
-
+    """Validate durations typed into Entry widgets and store them; empty entries keep their value."""
+    values = {}
+    for name, entry in (("intro_duration", intro_speed_entry), ("test_duration", test_speed_entry),
+                        ("space_duration", space_between_entry)):
+        text = entry.get().strip()
+        if text:
+            values[name] = text
+    try:
+        settings.update(**values)
+    except ValueError as e:
+        print("Invalid settings:", e)
+    return get_current_settings()
+
+
+def synthesize_voices(notes, duration, sample_rate=44100, gains=None, waveform="triangle"):
+    """Render any set of MIDI notes sounding together as float32 with peak 1.0.
+
+    gains optionally weights each voice before they are summed.
+    """
+    frequencies = [midi_to_frequency(note) for note in notes]
+    voices = wavetables[waveform].render_voices(frequencies, int(sample_rate * duration), sample_rate, gains)
+    return normalize_region(voices.sum(axis=0))
+
+
+def synthesize_progression(chords, chord_duration, sample_rate=44100, gains=None, waveform="triangle",
+                           fade_duration=0.1):
+    """Render a chord progression (e.g. a V-I cadence) as float32 with peak 1.0.
+
+    chords is a sequence of MIDI note collections played one after another,
+    each for chord_duration seconds with fade_duration fades at both ends.
+    gains, if given, mirrors chords with a gain per voice. Every voice of
+    every chord is rendered in one broadcasted pass, so a two-chord cadence
+    costs about as much as one chord twice as long.
+    """
+    num_samples = int(sample_rate * chord_duration)
+    notes = [note for chord in chords for note in chord]
+    voice_gains = None if gains is None else [gain for chord_gains in gains for gain in chord_gains]
+    voices = wavetables[waveform].render_voices([midi_to_frequency(note) for note in notes], num_samples,
+                                                sample_rate, voice_gains)
+
+    # Sum each chord's rows, then fade every chord in and out at once
+    chord_starts = np.cumsum([0] + [len(chord) for chord in chords[:-1]])
+    progression = np.add.reduceat(voices, chord_starts, axis=0)
+    fade_samples = min(int(fade_duration * sample_rate), num_samples // 2)
+    if fade_samples:
+        progression[:, :fade_samples] *= np.linspace(0, 1, fade_samples, dtype=np.float32)
+        progression[:, num_samples - fade_samples:] *= np.linspace(1, 0, fade_samples, dtype=np.float32)
+    return normalize_region(progression.reshape(-1))
+
+
+def synthesize_chord(key, target_duration, mode, sample_rate=44100, waveform="triangle"):
+    """Render the root, third and fifth of mode, moved to start on key, as a float32 chord with peak 1.0."""
+    notes = [key + mode[degree] - mode[0] for degree in (0, 2, 4)]
+    return synthesize_voices(notes, target_duration, sample_rate, waveform=waveform)
+
+
+def generate_chord(key, target_duration, mode, sample_rate=44100, waveform="triangle"):
+    """Return the chord from synthesize_chord quantized to int16 at full scale."""
+    return quantize(synthesize_chord(key, target_duration, mode, sample_rate, waveform))
+
+
+def sequential_segments(waveforms, offset=0):
+    """Lay waveforms end to end from offset; return (segments, end offset)."""
+    segments = []
+    for waveform in waveforms:
+        segments.append((offset, waveform))
+        offset += len(waveform)
+    return segments, offset
+
+
+def render_timeline(segments, total_samples=None, dtype=np.float32):
+    """Render (offset, waveform) segments into one preallocated buffer.
+
+    The output length is worked out up front, gaps between segments are
+    left as silence and each segment is copied in place exactly once.
+    """
+    if total_samples is None:
+        total_samples = max((offset + len(waveform) for offset, waveform in segments), default=0)
+    timeline = np.zeros(total_samples, dtype=dtype)
+    for offset, waveform in segments:
+        timeline[offset:offset + len(waveform)] = waveform
+    return timeline
+
+
+# Samples per chunk yielded by stream_timeline
+STREAM_CHUNK_SAMPLES = 8192
+
+
+def stream_timeline(segments, total_samples=None, chunk_size=STREAM_CHUNK_SAMPLES, gain=1.0, dtype=np.float32):
+    """Yield the timeline rendered by render_timeline as fixed-size chunks.
+
+    Only one chunk is materialized at a time, so memory is bounded by
+    chunk_size rather than the sequence length. gain is applied per chunk.
+    """
+    segments = sorted(segments, key=lambda segment: segment[0])
+    if total_samples is None:
+        total_samples = max((offset + len(waveform) for offset, waveform in segments), default=0)
+    first = 0  # Index of the first segment that may still overlap upcoming chunks
+    for start in range(0, total_samples, chunk_size):
+        stop = min(start + chunk_size, total_samples)
+        chunk = np.zeros(stop - start, dtype=dtype)
+        while first < len(segments) and segments[first][0] + len(segments[first][1]) <= start:
+            first += 1
+        for offset, waveform in segments[first:]:
+            if offset >= stop:
+                break
+            begin = max(offset, start)
+            end = min(offset + len(waveform), stop)
+            if end > begin:
+                chunk[begin - start:end - start] = waveform[begin - offset:end - offset]
+        if gain != 1.0:
+            np.multiply(chunk, np.float32(gain), out=chunk, casting='unsafe')
+        yield chunk
+
+
+def timeline_peak(segments, gain=1.0):
+    """Peak of the rendered timeline, worked out from its (non-overlapping) segments."""
+    peaks = {}
+    for _, waveform in segments:
+        if id(waveform) not in peaks:
+            peaks[id(waveform)] = np.max(np.abs(waveform), initial=0)
+    return np.float32(max(peaks.values(), default=0)) * np.float32(gain)
+
+
+def quantize_stream(chunks, peak, dither=False, rng=None):
+    """Quantize float32 chunks to int16 with one shared scale."""
+    for chunk in chunks:
+        yield quantize(chunk, peak, dither, rng)
+
+
+def wav_header(num_samples, sample_rate=44100, channels=1, sample_width=2):
+    """Return a 44-byte PCM WAV header for the given number of samples per channel."""
+    data_size = num_samples * channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels,
+                       sample_rate, sample_rate * channels * sample_width, channels * sample_width,
+                       sample_width * 8, b'data', data_size)
+
+
+class WavStreamWriter:
+    """Write int16 chunks to a WAV file as they arrive.
+
+    A placeholder header is written up front and its size fields are
+    patched once the writer is closed.
+    """
+
+    def __init__(self, target, sample_rate=44100, channels=1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.owns_file = isinstance(target, (str, bytes, os.PathLike))
+        self.file = open(target, 'wb') if self.owns_file else target
+        self.start = self.file.tell()
+        self.num_samples = 0
+        self.file.write(wav_header(0, sample_rate, channels))
+
+    def write(self, chunk):
+        chunk = np.ascontiguousarray(chunk, dtype='<i2')
+        self.file.write(chunk.tobytes())
+        self.num_samples += len(chunk)
+
+    def close(self):
+        if self.file is None:
+            return
+        end = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(wav_header(self.num_samples, self.sample_rate, self.channels))
+        self.file.seek(end)
+        if self.owns_file:
+            self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_wav_stream(target, chunks, sample_rate=44100):
+    """Stream int16 chunks into a WAV file (path or seekable file object)."""
+    with WavStreamWriter(target, sample_rate) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return target
+
+
+def stream_wav_bytes(chunks, num_samples, sample_rate=44100):
+    """Yield a WAV file as bytes for a known sample count, e.g. for a chunked HTTP response."""
+    yield wav_header(num_samples, sample_rate)
+    for chunk in chunks:
+        yield np.ascontiguousarray(chunk, dtype='<i2').tobytes()
+
+
+def normalize_region(region, peak=1.0):
+    """Scale a float32 buffer or slice of one in place so its peak hits the given value."""
+    max_val = np.max(np.abs(region), initial=0)
+    if max_val > 0 and max_val != peak:
+        np.multiply(region, np.float32(peak / max_val), out=region)
+    return region
 
 
 def generate_solfege_map_for_root(root_note, note_range=36):
@@ -178,40 +518,27 @@ def generate_sequence(sound_type, intro_duration, test_duration, space_duration,
 
     # Generate intro part based on sound_type
     if sound_type == "chord":
-        intro_audio = generate_chord(root_note, intro_duration, sample_rate)
+        triad = [root_note, root_note + (4 if major else 3), root_note + 7]
+        intro_segments, intro_end = sequential_segments([synthesize_voices(triad, intro_duration, sample_rate)])
     else:  # Assuming 'scale'
-        intro_audio = np.array([])
         intro_notes = list(range(root_note, root_note + note_range))[:num_notes]
-        for note in intro_notes:
-            frequency = midi_to_frequency(note)
-            waveform = create_note(frequency, intro_duration / len(intro_notes), sample_rate)
-            intro_audio = np.concatenate((intro_audio, waveform))
-
-    max_val = np.max(np.abs(intro_audio))
-    if max_val > 0:
-        intro_audio = intro_audio * (32767 / max_val)
-    intro_audio = np.nan_to_num(intro_audio).astype(np.int16)
+        intro_segments, intro_end = sequential_segments(
+            [synthesize_note(midi_to_frequency(note), intro_duration / len(intro_notes), sample_rate) for note in intro_notes])
 
-    silence_between_intro_and_test = np.zeros(int(sample_rate * space_duration), dtype=np.int16)
+    # Silence between intro and test is simply the gap left on the timeline
+    test_start = intro_end + int(sample_rate * space_duration)
 
     # Dynamic solfege map for generating test notes and names
     solfege_map = generate_solfege_map_for_root(root_note, 36)
     midi_notes = random.sample(range(root_note, root_note + note_range), num_notes)
     solfege_names = [solfege_map.get(note, "note_{}".format(note)) for note in midi_notes]
 
-    test_audio = np.array([])
-    for note in midi_notes:
-        frequency = midi_to_frequency(note)
-        waveform = create_note(frequency, test_duration, sample_rate)
-        test_audio = np.concatenate((test_audio, waveform))
+    test_segments, total_samples = sequential_segments(
+        [synthesize_note(midi_to_frequency(note), test_duration, sample_rate) for note in midi_notes], test_start)
 
-    max_val = np.max(np.abs(test_audio))
-    if max_val > 0:
-        test_audio = test_audio * (32767 / max_val)
-    test_audio = np.nan_to_num(test_audio).astype(np.int16)
-
-
-    combined_audio = np.concatenate((intro_audio, silence_between_intro_and_test, test_audio))
+    combined_audio = render_timeline(intro_segments + test_segments, total_samples)
+    normalize_region(combined_audio[:intro_end])
+    normalize_region(combined_audio[test_start:])
 
     sanitized_solfege_names = [name.replace('/', '|') for name in solfege_names]
 
@@ -222,17 +549,9 @@ def generate_sequence(sound_type, intro_duration, test_duration, space_duration,
         filename = "_".join(sanitized_solfege_names) + ".wav"  # Sanitized filename
 
     filepath = os.path.join(folder_name, filename)
-    write(filepath, sample_rate, combined_audio)
+    write_wav_stream(filepath, [quantize(combined_audio)], sample_rate)
     print(f"Root Note: {root_note}, Frequency: {midi_to_frequency(root_note)}")
 
 
 
     return filepath, filename
-
-
-
-print("Settings in use: ", intro_duration, test_duration, space_duration) 
-
-
-
-    
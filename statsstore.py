@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+# Default location of the answer history database
+STATS_DATABASE = "eartraining_stats.sqlite3"
+
+# Solfege syllable for each semitone above do
+SOLFEGE_DEGREES = ('do', 'ra', 're', 'me', 'mi', 'fa', 'fi', 'sol', 'le', 'la', 'te', 'ti')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    mode TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    number_of_notes INTEGER NOT NULL,
+    correct_notes INTEGER NOT NULL,
+    round_time REAL
+);
+CREATE TABLE IF NOT EXISTS answers (
+    round_id INTEGER NOT NULL REFERENCES rounds(id),
+    position INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    guess INTEGER,
+    degree INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    response_time REAL,
+    PRIMARY KEY (round_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rounds_by_time ON rounds (timestamp);
+CREATE INDEX IF NOT EXISTS rounds_by_mode ON rounds (mode, timestamp);
+CREATE INDEX IF NOT EXISTS answers_by_degree ON answers (degree, correct);
+
+-- Running totals kept up to date on every insert so reports never rescan the history
+CREATE TABLE IF NOT EXISTS degree_totals (
+    mode TEXT NOT NULL,
+    degree INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    response_time_sum REAL NOT NULL,
+    timed_attempts INTEGER NOT NULL,
+    PRIMARY KEY (mode, degree)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS confusion_totals (
+    degree INTEGER NOT NULL,
+    guess_degree INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (degree, guess_degree)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    rounds INTEGER NOT NULL,
+    perfect_rounds INTEGER NOT NULL,
+    notes INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (day, mode)
+) WITHOUT ROWID;
+"""
+
+
+class StatsStore:
+    """Append-only history of graded rounds in a local SQLite database.
+
+    Every round is stored with its per-note answers. Per-degree and per-day
+    totals are updated in the same transaction, so the stats reports read a
+    few dozen rows no matter how long the history grows. The database is
+    opened on first use.
+    """
+
+    def __init__(self, path=STATS_DATABASE):
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Open the database and create the schema if needed."""
+        if self.connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            if connection.execute("SELECT 1 FROM confusion_totals LIMIT 1").fetchone() is None:
+                # Histories recorded before confusion_totals existed are folded in once
+                with connection:
+                    connection.execute("INSERT INTO confusion_totals SELECT degree, (guess - 60) % 12, COUNT(*)"
+                                       " FROM answers WHERE guess IS NOT NULL GROUP BY 1, 2")
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def record_round(self, mode, key, difficulty, level, targets, guesses, correct, answer_times=(),
+                     round_time=None, timestamp=None):
+        """Append one graded round and update the running totals.
+
+        targets and guesses are MIDI notes relative to do (60-71), correct is
+        the per-note match vector and answer_times the seconds from the start
+        of the round to each guess. Returns the new round id.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        day = time.strftime("%Y-%m-%d", time.localtime(timestamp))
+        correct_notes = sum(correct)
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO rounds (timestamp, mode, key, difficulty, level, number_of_notes, correct_notes, round_time)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (timestamp, mode, key, difficulty, level, len(targets), correct_notes, round_time))
+                round_id = cursor.lastrowid
+
+                answers = []
+                previous_time = 0.0
+                for position, target in enumerate(targets):
+                    guess = guesses[position] if position < len(guesses) else None
+                    # Time spent on this note is the gap since the previous guess
+                    response_time = None
+                    if position < len(answer_times):
+                        response_time = answer_times[position] - previous_time
+                        previous_time = answer_times[position]
+                    answers.append((round_id, position, int(target), None if guess is None else int(guess),
+                                    (int(target) - 60) % 12, int(correct[position]), response_time))
+                connection.executemany("INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)", answers)
+
+                connection.executemany(
+                    "INSERT INTO degree_totals VALUES (?, ?, 1, ?, ?, ?)"
+                    " ON CONFLICT (mode, degree) DO UPDATE SET attempts = attempts + 1,"
+                    " correct = correct + excluded.correct,"
+                    " response_time_sum = response_time_sum + excluded.response_time_sum,"
+                    " timed_attempts = timed_attempts + excluded.timed_attempts",
+                    [(mode, degree, is_correct, response_time or 0.0, int(response_time is not None))
+                     for _, _, _, _, degree, is_correct, response_time in answers])
+                connection.executemany(
+                    "INSERT INTO confusion_totals VALUES (?, ?, 1)"
+                    " ON CONFLICT (degree, guess_degree) DO UPDATE SET count = count + 1",
+                    [(degree, (guess - 60) % 12) for _, _, _, guess, degree, _, _ in answers if guess is not None])
+                connection.execute(
+                    "INSERT INTO daily_totals VALUES (?, ?, 1, ?, ?, ?)"
+                    " ON CONFLICT (day, mode) DO UPDATE SET rounds = rounds + 1,"
+                    " perfect_rounds = perfect_rounds + excluded.perfect_rounds,"
+                    " notes = notes + excluded.notes, correct = correct + excluded.correct",
+                    (day, mode, int(correct_notes == len(targets)), len(targets), correct_notes))
+        return round_id
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.connect().execute(sql, parameters).fetchall()
+
+    def accuracy_by_degree(self, mode=None):
+        """Map solfege syllable -> (attempts, accuracy, mean response time), optionally for one mode."""
+        sql = ("SELECT degree, SUM(attempts), SUM(correct), SUM(response_time_sum), SUM(timed_attempts)"
+               " FROM degree_totals")
+        parameters = ()
+        if mode is not None:
+            sql += " WHERE mode = ?"
+            parameters = (mode,)
+        rows = self.query(sql + " GROUP BY degree ORDER BY degree", parameters)
+        return {SOLFEGE_DEGREES[degree]: (attempts, correct / attempts, response_sum / timed if timed else None)
+                for degree, attempts, correct, response_sum, timed in rows}
+
+    def accuracy_by_mode(self):
+        """Map mode name -> (rounds, note accuracy, share of perfect rounds)."""
+        rows = self.query("SELECT mode, SUM(rounds), SUM(notes), SUM(correct), SUM(perfect_rounds)"
+                          " FROM daily_totals GROUP BY mode ORDER BY mode")
+        return {mode: (rounds, correct / notes, perfect / rounds) for mode, rounds, notes, correct, perfect in rows}
+
+    def accuracy_over_time(self, days=30, mode=None):
+        """List of (day, rounds, note accuracy) for the most recent days with any rounds."""
+        sql = "SELECT day, SUM(rounds), SUM(notes), SUM(correct) FROM daily_totals"
+        parameters = ()
+        if mode is not None:
+            sql += " WHERE mode = ?"
+            parameters = (mode,)
+        rows = self.query(sql + " GROUP BY day ORDER BY day DESC LIMIT ?", parameters + (days,))
+        return [(day, rounds, correct / notes) for day, rounds, notes, correct in reversed(rows)]
+
+    def confusion_matrix(self):
+        """12x12 array of answer counts, rows by target degree and columns by guessed degree."""
+        confusion = np.zeros((12, 12), dtype=np.int64)
+        for degree, guess_degree, count in self.query("SELECT degree, guess_degree, count FROM confusion_totals"):
+            confusion[degree, guess_degree] = count
+        return confusion
+
+    def recent_rounds(self, limit=20):
+        """The latest rounds, newest first, as dictionaries."""
+        rows = self.query("SELECT id, timestamp, mode, key, difficulty, level, number_of_notes, correct_notes,"
+                          " round_time FROM rounds ORDER BY id DESC LIMIT ?", (limit,))
+        columns = ("id", "timestamp", "mode", "key", "difficulty", "level", "number_of_notes", "correct_notes",
+                   "round_time")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def summary(self):
+        """Totals over the whole history: rounds, notes answered and note accuracy."""
+        rounds, notes, correct = self.query("SELECT SUM(rounds), SUM(notes), SUM(correct) FROM daily_totals")[0]
+        if not rounds:
+            return {"rounds": 0, "notes": 0, "accuracy": None}
+        return {"rounds": rounds, "notes": notes, "accuracy": correct / notes}
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from exportpack import export_pack, PACK_DESCRIPTOR
+
+
+def export(output, seed, rerender=False):
+    return export_pack(str(output), ["Ionian"], ["C"], ["Easy"], 3, seed=seed, workers=1, quality="low",
+                       rerender=rerender)
+
+
+def read_files(output, rows):
+    contents = {}
+    for row in rows:
+        with open(os.path.join(output, row["file"]), "rb") as file:
+            contents[row["file"]] = file.read()
+    return contents
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Banks are written to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def test_resume_with_same_parameters(tmp_path):
+    output = tmp_path / "pack"
+    rows = export(output, 0)
+    assert rows[0]["duration"] == 2.0
+    with open(output / PACK_DESCRIPTOR) as file:
+        assert json.load(file)["seed"] == 0
+
+    # A resumed run renders only what is missing and leaves complete files alone
+    first = output / rows[0]["file"]
+    os.unlink(output / rows[1]["file"])
+    mtime = os.stat(first).st_mtime_ns
+    assert export(output, 0) == rows
+    assert os.stat(first).st_mtime_ns == mtime
+    assert os.path.exists(output / rows[1]["file"])
+
+
+def test_resume_with_different_parameters(tmp_path):
+    output = tmp_path / "pack"
+    export(output, 0)
+    with pytest.raises(ValueError):
+        export(output, 5)
+    with open(output / PACK_DESCRIPTOR) as file:
+        assert json.load(file)["seed"] == 0
+
+    # Re-rendering replaces every file, so the audio matches the new answers
+    rows = export(output, 5, rerender=True)
+    fresh_rows = export(tmp_path / "fresh", 5)
+    assert rows == fresh_rows
+    assert read_files(output, rows) == read_files(tmp_path / "fresh", fresh_rows)
+    with open(output / "manifest.json") as file:
+        assert json.load(file) == rows
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from chordbank import ChordBank
+from memorybank import MemoryBank
+from notebank import NoteBank
+
+CADENCE = ((55, 59, 62), (60, 64, 67))
+
+
+def reopen(bank):
+    """A fresh bank object over the same files, as a new process would see them."""
+    return NoteBank(bank.notes, bank.durations, bank.sample_rate, bank.directory)
+
+
+@pytest.fixture
+def note_bank(tmp_path):
+    bank = NoteBank([60, 62], [0.5, 1.0], 16000, str(tmp_path))
+    bank.open()
+    return bank
+
+
+def test_lookups(tmp_path, note_bank):
+    assert note_bank.note(62, 1.0).shape == (16000,)
+    assert note_bank.note(61, 1.0) is None
+    chord_bank = ChordBank([CADENCE], 16000, str(tmp_path))
+    assert chord_bank.cadence(*CADENCE).shape == (32000,)
+    assert chord_bank.cadence((55, 59, 62), (60, 63, 67)) is None
+
+
+def test_current_bank_is_not_rebuilt(note_bank):
+    mtime = os.stat(note_bank.path()).st_mtime_ns
+    reopen(note_bank).open()
+    assert os.stat(note_bank.path()).st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize("damage", ["missing", "truncated", "wrong_shape"])
+def test_damaged_bank_is_rebuilt(note_bank, damage):
+    expected = np.array(note_bank.note(62, 0.5))
+    path = note_bank.path()
+    if damage == "missing":
+        os.unlink(path)
+    elif damage == "truncated":
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) // 2)
+    else:
+        np.save(path, np.zeros(10, dtype=np.float32))
+
+    bank = reopen(note_bank)
+    assert np.array_equal(bank.note(62, 0.5), expected)
+
+
+def test_incomplete_subclass_cannot_be_created(tmp_path):
+    class NoLayoutBank(MemoryBank):
+        file_prefix = "incomplete"
+
+        def parameters(self):
+            return {}
+
+        def render(self, bank, entries):
+            pass
+
+        def lookup_table(self, entries):
+            return {}
+
+    with pytest.raises(TypeError):
+        NoLayoutBank(16000, str(tmp_path))
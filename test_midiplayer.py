@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+pytest.importorskip("mido")
+
+from midiplayer import MidiPlayer, round_events
+
+
+class MemoryPort:
+    """In-memory output port recording every message sent to it."""
+
+    def __init__(self):
+        self.messages = []
+        self.condition = threading.Condition()
+
+    def send(self, message):
+        with self.condition:
+            self.messages.append(message)
+            self.condition.notify_all()
+
+    def wait_for(self, count, timeout=1.0):
+        """Block until count messages have been sent; False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.messages) >= count, timeout)
+
+    def close(self):
+        pass
+
+
+def sent(port):
+    return [(message.type, message.note) for message in port.messages]
+
+
+def test_round_events_layout():
+    events = round_events((55, 59), (60, 64), [62, 67], 0.5, interlude_duration=1.0)
+    assert events == sorted(events, key=lambda event: (event[0], event[1] == 'note_on'))
+    assert [event for event in events if event[1] == 'note_on'] == [
+        (0.0, 'note_on', 55, 64), (0.0, 'note_on', 59, 64),
+        (1.0, 'note_on', 60, 64), (1.0, 'note_on', 64, 64),
+        (2.5, 'note_on', 62, 64), (3.0, 'note_on', 67, 64)
+    ]
+    # A note ending exactly when the next starts is switched off first
+    assert events.index((3.0, 'note_off', 62, 0)) < events.index((3.0, 'note_on', 67, 64))
+
+
+def test_play_sends_events_in_order():
+    port = MemoryPort()
+    player = MidiPlayer(port)
+    reports = []
+    player.on_jitter = reports.append
+    events = round_events((55, 59, 62), (60, 64, 67), [62, 65, 69], 0.01, interlude_duration=0.01)
+    player.play(events)
+    player.wait()
+
+    assert sent(port) == [(kind, note) for _, kind, note, _ in events]
+    report = player.jitter_report()
+    assert report["events"] == len(events)
+    assert 0.0 <= report["mean_ms"] <= report["p99_ms"] <= report["max_ms"]
+    assert reports == [report]
+
+
+def test_stop_switches_off_sounding_notes():
+    port = MemoryPort()
+    player = MidiPlayer(port)
+    # The cadence sounds for a long time, so stop() lands while it is held
+    player.play(round_events((55, 59, 62), (60, 64, 67), [62], 10.0))
+    assert port.wait_for(3)
+    player.stop()
+
+    assert sent(port) == [('note_on', 55), ('note_on', 59), ('note_on', 62),
+                          ('note_off', 55), ('note_off', 59), ('note_off', 62)]
+    assert player.jitter_report()["events"] == 3
+    player.close()
+
+
+def test_jitter_report_empty():
+    assert MidiPlayer(MemoryPort()).jitter_report() is None
+
+
+def test_game_events_follow_space_duration(tmp_path, monkeypatch):
+    from EarTraining import EarTrainingGame
+    from settingsstore import settings
+
+    monkeypatch.chdir(tmp_path)  # Banks and settings are written to the working directory
+    game = EarTrainingGame(autoplay=False, record_stats=False, quality="low")
+    game.midi_test_notes_list = [62]
+    first_note = 3 * game.difficulty["duration"]
+    previous = settings.get("space_duration")
+    try:
+        for space_duration in (1.0, 2.5):
+            settings.update(space_duration=space_duration)
+            assert (first_note + space_duration, 'note_on', 62, 64) in game.midi_events()
+    finally:
+        settings.update(space_duration=previous)
+        settings.flush()
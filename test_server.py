@@ -0,0 +1,143 @@
+import io
+import json
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+
+from EarTraining_server import SessionTable, create_app
+
+
+def call(app, method, path, payload=None):
+    """Run one request through the WSGI app and return (status code, headers, body bytes)."""
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": path, "CONTENT_LENGTH": str(len(body)),
+               "CONTENT_TYPE": "application/json", "wsgi.input": io.BytesIO(body)}
+    setup_testing_defaults(environ)
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split()[0])
+        response["headers"] = dict(headers)
+
+    content = b"".join(app(environ, start_response))
+    return response["status"], response["headers"], content
+
+
+def call_json(app, method, path, payload=None):
+    status, _, content = call(app, method, path, payload)
+    return status, json.loads(content)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Banks are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    app = create_app(SessionTable(max_sessions=2, quality="low"))
+    yield app
+    for session_id in list(app.sessions.sessions):
+        app.sessions.remove(session_id)
+
+
+def new_session(app):
+    status, reply = call_json(app, "POST", "/session")
+    assert status == 200
+    return reply["session"]
+
+
+def test_round_trip(app):
+    session = new_session(app)
+    status, reply = call_json(app, "POST", "/session/%s/set_difficulty" % session, {"difficulty": "Easy"})
+    assert status == 200
+    status, reply = call_json(app, "POST", "/session/%s/start" % session)
+    assert status == 200 and reply["running"]
+    assert reply["number_of_notes"] == 2
+
+    status, headers, content = call(app, "GET", "/session/%s/audio" % session)
+    assert status == 200
+    assert headers["Content-Type"] == "audio/wav"
+    assert content[:4] == b"RIFF" and content[8:12] == b"WAVE"
+
+    status, reply = call_json(app, "POST", "/session/%s/guess" % session, {"guesses": ["do", "re"]})
+    assert status == 200 and len(reply["guesses"]) == 2
+
+    status, reply = call_json(app, "POST", "/session/%s/validate" % session)
+    assert status == 200
+    assert len(reply["answer"]) == len(reply["detailed_match"]) == 2
+    assert reply["overall_match"] == int(all(reply["detailed_match"]))
+
+
+def test_errors(app):
+    session = new_session(app)
+    status, reply = call_json(app, "POST", "/session/%s/validate" % session)
+    assert (status, reply["error"]) == (400, "no round generated yet")
+    status, reply = call_json(app, "GET", "/session/%s/audio" % session)
+    assert status == 409
+
+    status, reply = call_json(app, "POST", "/session/%s/set_mode" % session, {"mode": "Nonexistent"})
+    assert status == 400
+    status, reply = call_json(app, "POST", "/session/%s/guess" % session, {"solfege": "xx"})
+    assert status == 400
+    status, reply = call_json(app, "POST", "/session/%s/jump" % session)
+    assert status == 400
+
+    # Malformed payloads are client errors too, not server failures
+    for action, payload in [("guess", [1, 2]), ("guess", {"guesses": 5}), ("guess", {"guesses": [["do"]]}),
+                            ("set_mode", {"mode": "Custom"}), ("set_mode", {"mode": ["Ionian"]}),
+                            ("set_key", {"key": ["C"]})]:
+        status, reply = call_json(app, "POST", "/session/%s/%s" % (session, action), payload)
+        assert status == 400, (action, payload)
+    status, reply = call_json(app, "POST", "/session/%s/start" % session)
+    assert status == 200 and reply["running"]
+
+    status, reply = call_json(app, "POST", "/session/%s/validate" % session)
+    assert status == 400 and reply["error"].startswith("expected")
+
+    status, reply = call_json(app, "POST", "/session/unknown/state")
+    assert status == 404
+
+
+def test_session_limit_and_reaping(app):
+    sessions = app.sessions
+    first, second = new_session(app), new_session(app)
+    status, reply = call_json(app, "POST", "/session")
+    assert status == 503
+
+    status, reply = call_json(app, "DELETE", "/session/%s" % first)
+    assert status == 200
+    assert call_json(app, "POST", "/session/%s/state" % first)[0] == 404
+    third = new_session(app)
+
+    # Idle sessions are reaped to make room for new ones
+    call_json(app, "POST", "/session/%s/start" % second)
+    game = sessions.get(second)
+    sessions.idle_timeout = 0.0
+    assert new_session(app) not in (second, third)
+    assert sessions.get(second) is None and sessions.get(third) is None
+    assert not game.running
+
+
+class FakeWebSocket:
+    """Replays queued messages and records what the server sends back."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def receive(self):
+        return self.messages.pop(0) if self.messages else None
+
+    def send(self, message, binary=False):
+        self.sent.append(message)
+
+
+def test_websocket_survives_bad_messages(app):
+    ws = FakeWebSocket(["[1, 2]", "not json", json.dumps({"action": "guess", "guesses": 5}),
+                        json.dumps({"action": "set_mode", "mode": "Custom"}), json.dumps({"action": "state"})])
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/ws", "wsgi.websocket": ws}
+    setup_testing_defaults(environ)
+    b"".join(app(environ, lambda status, headers, exc_info=None: None))
+
+    replies = [json.loads(message) for message in ws.sent]
+    assert all("error" in reply for reply in replies[:4])
+    assert replies[4]["running"] is False
+    assert len(app.sessions) == 0  # The connection's session ends with it
@@ -0,0 +1,44 @@
+import json
+
+from tracing import Tracer, tracer
+
+
+def test_summary_written_on_disable(tmp_path):
+    local = Tracer()
+    local.enable(str(tmp_path / "trace.jsonl"), str(tmp_path / "summary.json"))
+    for seconds in (0.001, 0.002, 0.004):
+        local.finish_round({"synthesis": seconds}, key=0)
+    local.disable()
+
+    with open(tmp_path / "summary.json") as file:
+        summary = json.load(file)
+    assert summary["rounds"] == 3
+    assert summary["spans"]["synthesis"]["count"] == 3
+    assert sum(summary["spans"]["synthesis"]["histogram_ms"].values()) == 3
+    with open(tmp_path / "trace.jsonl") as file:
+        assert len(file.readlines()) == 3
+
+
+def test_skipped_rounds_are_traced(tmp_path, monkeypatch):
+    from EarTraining import EarTrainingGame
+
+    monkeypatch.chdir(tmp_path)  # Banks are written to the working directory
+    tracer.enable(str(tmp_path / "trace.jsonl"), str(tmp_path / "summary.json"))
+    try:
+        game = EarTrainingGame(autoplay=False, record_stats=False, prefetch_depth=0, quality="low")
+        game.start_game()
+        game.restart_game()  # Skips the first round
+        for midi_note in game.pre_octave_key_list:
+            game.user_guesses.append(midi_note)
+        game.validate_user_input()
+        game.restart_game()
+        game.stop_game()  # Leaves the third round unanswered
+    finally:
+        tracer.disable()
+
+    with open(tmp_path / "trace.jsonl") as file:
+        rounds = [json.loads(line) for line in file]
+    assert [line.get("skipped", False) for line in rounds] == [True, False, True]
+    assert rounds[1]["correct_percentage"] == 1.0
+    with open(tmp_path / "summary.json") as file:
+        assert json.load(file)["spans"]["next_to_sound"]["count"] >= 3
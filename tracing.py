@@ -0,0 +1,155 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from atomicfile import atomic_write
+
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, float("inf"))
+SAMPLES_PER_SPAN = 10000  # Recent durations kept per span for percentiles
+
+
+class _NullSpan:
+    """Shared do-nothing context manager handed out while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+
+    __slots__ = ("name", "record", "start")
+
+    def __init__(self, name, record):
+        self.name = name
+        self.record = record
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        self.record[self.name] = self.record.get(self.name, 0.0) + elapsed
+        return False
+
+
+# Collects named timing spans per round and exports them
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+        self.output = None  # Open JSON lines file, if exporting
+        self.summary_path = None  # Where summary() is written when tracing stops, if anywhere
+        self.exit_hook = False  # Whether disable() is registered to run at exit
+        self.samples = {}  # Span name -> deque of recent durations in seconds
+        self.histograms = {}  # Span name -> bucket counts
+        self.rounds = 0
+        self.lock = threading.Lock()
+
+    def enable(self, path=None, summary_path=None):
+        """Start tracing, appending one JSON line per finished round to path if given.
+
+        The aggregate summary is written to summary_path by disable(), which
+        also runs at exit.
+        """
+        with self.lock:
+            if path is not None and self.output is None:
+                self.output = open(path, "a")
+            if summary_path is not None:
+                self.summary_path = summary_path
+            self.enabled = True
+            if not self.exit_hook:
+                atexit.register(self.disable)
+                self.exit_hook = True
+
+    def enable_from_environment(self, variable="EARTRAINING_TRACE"):
+        """Enable tracing when the environment variable names an output file.
+
+        The summary goes next to it, e.g. trace.jsonl -> trace.summary.json.
+        """
+        path = os.environ.get(variable)
+        if path:
+            self.enable(path, os.path.splitext(path)[0] + ".summary.json")
+
+    def disable(self):
+        """Stop tracing, closing the JSON lines file and writing the summary if one was requested."""
+        with self.lock:
+            self.enabled = False
+            if self.output is not None:
+                self.output.close()
+                self.output = None
+            summary_path = self.summary_path
+            self.summary_path = None
+        if summary_path is not None and self.samples:
+            self.write_summary(summary_path)
+
+    def write_summary(self, path):
+        """Write summary() to path as JSON, replacing the file atomically."""
+        spans = self.summary()
+        with atomic_write(path, 'w') as file:
+            json.dump({"rounds": self.rounds, "spans": spans}, file, indent=2)
+
+    def span(self, name, record):
+        """Time a block and add its duration to record[name] (seconds).
+
+        While tracing is disabled this returns a shared no-op context manager.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(name, record)
+
+    def finish_round(self, record, **info):
+        """Fold a round's spans into the histograms and export them as a JSON line."""
+        if not self.enabled or not record:
+            return
+        with self.lock:
+            self.rounds += 1
+            for name, seconds in record.items():
+                self.samples.setdefault(name, deque(maxlen=SAMPLES_PER_SPAN)).append(seconds)
+                counts = self.histograms.setdefault(name, [0] * len(HISTOGRAM_BUCKETS_MS))
+                milliseconds = seconds * 1000
+                for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+                    if milliseconds <= bound:
+                        counts[index] += 1
+                        break
+            if self.output is not None:
+                line = dict(info, round=self.rounds, timestamp=time.time(),
+                            spans_ms={name: seconds * 1000 for name, seconds in record.items()})
+                self.output.write(json.dumps(line) + "\n")
+                self.output.flush()
+
+    def summary(self):
+        """Aggregate statistics and histogram bucket counts per span name."""
+        with self.lock:
+            summary = {}
+            for name, samples in self.samples.items():
+                ordered = sorted(samples)
+
+                def percentile(fraction):
+                    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000
+
+                summary[name] = {
+                    "count": len(ordered),
+                    "mean_ms": sum(ordered) / len(ordered) * 1000,
+                    "p50_ms": percentile(0.5),
+                    "p90_ms": percentile(0.9),
+                    "p99_ms": percentile(0.99),
+                    "max_ms": ordered[-1] * 1000,
+                    "histogram_ms": {str(bound): count for bound, count
+                                     in zip(HISTOGRAM_BUCKETS_MS, self.histograms[name])}
+                }
+            return summary
+
+
+tracer = Tracer()